@@ -0,0 +1,59 @@
+"""
+Compares construction time and memory of `Event` and `Reading` log items.
+
+Run with `python -m benchmarks.readings [N_ROWS]`.
+"""
+
+from __future__ import annotations
+
+import gc
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable, List, Tuple
+
+from my_iot.types_ import Event, Reading
+
+N_ROWS = 1000000
+
+Rows = List[Tuple[float, float]]
+
+
+def make_events(rows: Rows) -> List[Any]:
+    return [Event(timestamp=datetime.fromtimestamp(timestamp, timezone.utc), value=value) for timestamp, value in rows]
+
+
+def make_readings(rows: Rows) -> List[Any]:
+    return [Reading(timestamp, value) for timestamp, value in rows]
+
+
+def measure(make: Callable[[Rows], List[Any]], rows: Rows) -> Tuple[float, int]:
+    """
+    Get the construction time in seconds and the allocated memory in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start_time = perf_counter()
+    items = make(rows)
+    elapsed = perf_counter() - start_time
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return elapsed, size
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    rows = [(1546300800.0 + i, float(i % 100)) for i in range(n_rows)]
+    print(f'{"type":>10} {"total, s":>10} {"per row, µs":>12} {"memory, MiB":>12} {"per row, B":>11}')
+    for name, make in (('Event', make_events), ('Reading', make_readings)):
+        elapsed, size = measure(make, rows)
+        print(
+            f'{name:>10} {elapsed:>10.2f} {elapsed / n_rows * 1e6:>12.2f}'
+            f' {size / 1048576:>12.1f} {size / n_rows:>11.0f}',
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Measures the event dispatch cost against the number of handlers.
+
+Run with `python -m benchmarks.routing`.
+"""
+
+from __future__ import annotations
+
+from asyncio import run
+from time import perf_counter
+from typing import Any
+
+from my_iot.routing import EventRouter, if_changed, if_channel_like
+from my_iot.types_ import Event
+
+N_EVENTS = 10000
+
+
+def make_router(n_handlers: int) -> EventRouter:
+    """
+    Make a router with a realistic mix of handlers: mostly channel specific, some of them with patterns.
+    """
+    router = EventRouter()
+    for i in range(n_handlers):
+        regex = f'bench:{i}:value' if i % 10 else rf'bench:{i}:.*'
+
+        @router
+        @if_channel_like(regex)
+        @if_changed
+        async def handler(**_: Any):
+            pass
+
+    return router
+
+
+async def dispatch_all(router: EventRouter, events: Any):
+    for event in events:
+        for handler in router.handlers:
+            await handler(event=event, previous=None)
+
+
+async def dispatch_indexed(router: EventRouter, events: Any):
+    for event in events:
+        await router.on_event(event=event, previous=None)
+
+
+def main():
+    print(f'{"handlers":>10} {"all, µs":>10} {"indexed, µs":>12}')
+    for n_handlers in (10, 100, 1000):
+        router = make_router(n_handlers)
+        events = [Event(channel=f'bench:{i % n_handlers}:value', value=i) for i in range(N_EVENTS)]
+        timings = []
+        for dispatch in (dispatch_all, dispatch_indexed):
+            start_time = perf_counter()
+            run(dispatch(router, events))
+            timings.append((perf_counter() - start_time) / N_EVENTS * 1e6)
+        print(f'{n_handlers:>10} {timings[0]:>10.1f} {timings[1]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
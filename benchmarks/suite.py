@@ -0,0 +1,288 @@
+"""
+Runs the benchmarks of ingestion, storage, dispatch and rendering against a temporary database
+and saves the results as JSON, so that they can be compared between versions.
+
+Run with `python -m benchmarks.suite [--quick] [--output results.json] [--baseline previous.json]`.
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+from asyncio import gather, run
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import click
+import pkg_resources
+from aiohttp import ClientSession, TCPConnector, web
+from aiohttp.test_utils import TestServer
+from loguru import logger
+from sqlitemap import Connection
+
+from benchmarks.routing import make_router
+from my_iot import templates
+from my_iot.charts import make_float_chart
+from my_iot.context import Context
+from my_iot.database import get_downsampled_log, get_log, open_database, save_event, save_events
+from my_iot.pool import ReaderPool
+from my_iot.types_ import Event, Unit
+from my_iot.web import measure_latency, routes
+
+# Existing rows before `save_event` is measured.
+ROW_COUNTS = (1000, 10000, 100000, 1000000)
+
+# Periods of a minutely channel read by `get_log` and the chart.
+PERIODS = {
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+}
+
+HANDLER_COUNTS = (10, 100, 1000)
+CONCURRENCIES = (1, 10, 50)
+
+N_EVENTS = 5000
+N_SAVES = 200
+N_REPEATS = 5
+N_REQUESTS = 200
+N_CHANNELS = 100
+
+SECOND = timedelta(seconds=1)
+MINUTE = timedelta(minutes=1)
+
+# Prefilled rows are saved in transactions of this size.
+FILL_BATCH_SIZE = 10000
+
+
+class Results:
+    """
+    Collects the measurements.
+    """
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+
+    def add(self, name: str, metric: str, value: float, **params: Any):
+        self.items.append({'name': name, 'params': params, 'metric': metric, 'value': value})
+        click.echo(f'{name:<16} {format_params(params):<36} {metric:<16} {value:>12.3f}')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': get_version(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'results': self.items,
+        }
+
+
+def get_version() -> str:
+    try:
+        return pkg_resources.get_distribution('my_iot').version
+    except pkg_resources.DistributionNotFound:
+        return 'unknown'  # not installed
+
+
+def format_params(params: Dict[str, Any]) -> str:
+    return ' '.join(f'{key}={value}' for key, value in params.items())
+
+
+def get_result_key(item: Dict[str, Any]) -> str:
+    return f'{item["name"]} {format_params(item["params"])} {item["metric"]}'
+
+
+def make_events(channel: str, unit: Unit, end: datetime, step: timedelta, count: int) -> Iterable[Event]:
+    """
+    Make the events without validation, so that prefilling a large database doesn't take ages.
+    """
+    start = end - step * count
+    for i in range(count):
+        yield Event.construct(
+            {'channel': channel, 'unit': unit, 'value': float(i % 100), 'timestamp': start + step * i, 'title': None},
+            {'channel', 'unit', 'value', 'timestamp'},
+        )
+
+
+def fill(db: Connection, events: Iterable[Event]):
+    batch: List[Event] = []
+    for event in events:
+        batch.append(event)
+        if len(batch) == FILL_BATCH_SIZE:
+            save_events(db, batch)
+            batch.clear()
+    save_events(db, batch)
+
+
+def measure(callable_: Callable[[], Any], repeat: int = N_REPEATS) -> float:
+    """
+    Get the median duration of the call, in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start_time = perf_counter()
+        callable_()
+        timings.append((perf_counter() - start_time) * 1000.0)
+    return median(timings)
+
+
+def bench_save_event(results: Results, directory: Path, row_counts: Iterable[int]):
+    """
+    Latency of a single event commit against the number of the existing rows of the channel.
+    """
+    for unit in (Unit.CELSIUS, Unit.TEXT):
+        db = open_database(str(directory / f'save_{unit.value.lower()}.sqlite3'))
+        now = datetime.now(timezone.utc)
+        n_rows = 0
+        for row_count in row_counts:
+            # Prefill the older readings one per second, so that the newest chunks are full.
+            fill(db, make_events('bench', unit, now - timedelta(seconds=n_rows), SECOND, row_count - n_rows))
+            n_rows = row_count
+            # New readings follow the prefilled ones.
+            events = iter(list(make_events('bench', unit, now + SECOND * N_SAVES, SECOND, N_SAVES)))
+            latency = measure(lambda: save_event(db, next(events)), N_SAVES)
+            results.add('save_event', 'latency_ms', latency, unit=unit.value, rows=row_count)
+            now += SECOND * N_SAVES
+        db.close()
+
+
+def bench_log(results: Results, directory: Path, periods: Dict[str, timedelta]):
+    """
+    Latency of reading a minutely channel log and building its chart.
+    """
+    db = open_database(str(directory / 'log.sqlite3'))
+    longest = max(periods.values())
+    fill(db, make_events('bench', Unit.CELSIUS, datetime.now(timezone.utc), MINUTE, longest // MINUTE))
+    for name, period in periods.items():
+        results.add('get_log', 'latency_ms', measure(lambda: get_log(db, 'bench', period)), period=name)
+        latency = measure(lambda: make_float_chart(*get_downsampled_log(db, 'bench', period)))
+        results.add('chart', 'latency_ms', latency, period=name)
+    db.close()
+
+
+def bench_routing(results: Results, handler_counts: Iterable[int]):
+    """
+    Dispatch cost per event against the number of handlers.
+    """
+    for n_handlers in handler_counts:
+        router = make_router(n_handlers)
+        events = [Event(channel=f'bench:{i % n_handlers}:value', value=i) for i in range(N_EVENTS)]
+
+        async def dispatch():
+            for event in events:
+                await router.on_event(event=event, previous=None)
+
+        elapsed = measure(lambda: run(dispatch()), 1)
+        results.add('dispatch', 'latency_us', elapsed / N_EVENTS * 1000.0, handlers=n_handlers)
+
+
+async def bench_on_event(results: Results, directory: Path):
+    """
+    Pipeline throughput with and without the write batching.
+    """
+    for batch_size in (1, 100):
+        automation = ModuleType('benchmark_automation')
+        automation.WRITE_BATCH_SIZE = batch_size
+        automation.WRITE_BATCH_DELAY = timedelta(milliseconds=10)
+        context = Context(automation=automation, db=open_database(str(directory / f'on_event_{batch_size}.sqlite3')))
+        events = list(make_events('bench', Unit.CELSIUS, datetime.now(timezone.utc), SECOND, N_EVENTS))
+        start_time = perf_counter()
+        for i in range(0, N_EVENTS, context.queue_workers):
+            await gather(*[context.on_event(event) for event in events[i:i + context.queue_workers]])
+        elapsed = perf_counter() - start_time
+        await context.close()
+        results.add('on_event', 'events_per_s', N_EVENTS / elapsed, batch_size=batch_size)
+
+
+async def bench_web(results: Results, directory: Path, concurrencies: Iterable[int]):
+    """
+    Page latency and throughput under concurrent requests.
+    """
+    path = str(directory / 'web.sqlite3')
+    db = open_database(path)
+    now = datetime.now(timezone.utc)
+    for i in range(N_CHANNELS):
+        fill(db, make_events(f'bench:{i}', Unit.CELSIUS, now, MINUTE, 1440 if i == 0 else 1))
+
+    context = Context(automation=ModuleType('benchmark_automation'), db=db, readers=ReaderPool(path, 4))
+    app = web.Application(middlewares=[measure_latency])
+    app['context'] = context
+    app.add_routes(routes)
+    templates.setup(app)
+
+    async with TestServer(app) as server:
+        for concurrency in concurrencies:
+            async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+                for url in ('/', '/channel/bench:0'):
+                    start_time = perf_counter()
+                    latencies = await request_concurrently(session, str(server.make_url(url)), concurrency)
+                    throughput = len(latencies) / (perf_counter() - start_time)
+                    results.add('render', 'latency_ms', median(latencies), url=url, concurrency=concurrency)
+                    results.add('render', 'requests_per_s', throughput, url=url, concurrency=concurrency)
+    await context.close()
+
+
+async def request_concurrently(session: ClientSession, url: str, concurrency: int) -> List[float]:
+    """
+    Request the URL from the concurrent clients. Returns the latencies in milliseconds.
+    """
+    latencies: List[float] = []
+
+    async def request():
+        for _ in range(N_REQUESTS // concurrency):
+            start_time = perf_counter()
+            async with session.get(url) as response:
+                assert response.status == 200, response.status
+                await response.read()
+            latencies.append((perf_counter() - start_time) * 1000.0)
+
+    await gather(*[request() for _ in range(concurrency)])
+    return latencies
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """
+    Print the changes against the baseline results.
+    """
+    baseline_values = {get_result_key(item): item['value'] for item in baseline['results']}
+    click.echo(f'\nCompared to {baseline["version"]}:')
+    for item in results['results']:
+        previous = baseline_values.get(get_result_key(item))
+        if previous:
+            click.echo(f'{get_result_key(item):<70} {item["value"] / previous:>8.2f}×')
+
+
+async def run_async_benchmarks(results: Results, directory: Path, concurrencies: Iterable[int]):
+    await bench_on_event(results, directory)
+    await bench_web(results, directory, concurrencies)
+
+
+@click.command()
+@click.option('quick', '--quick', is_flag=True, help='Skip the largest databases.')
+@click.option('output', '--output', type=click.Path(dir_okay=False), default='benchmark.json', help='Results file.')
+@click.option('baseline', '--baseline', type=click.Path(exists=True, dir_okay=False), help='Previous results file.')
+def main(quick: bool, output: str, baseline: Optional[str]):
+    logger.remove()
+    row_counts = ROW_COUNTS[:-1] if quick else ROW_COUNTS
+    periods = {name: period for name, period in PERIODS.items() if not quick or name != 'year'}
+    results = Results()
+    with TemporaryDirectory(prefix='my-iot-benchmark-') as directory:
+        bench_save_event(results, Path(directory), row_counts)
+        bench_log(results, Path(directory), periods)
+        bench_routing(results, HANDLER_COUNTS)
+        run(run_async_benchmarks(results, Path(directory), CONCURRENCIES))
+    report = results.to_dict()
+    Path(output).write_text(json.dumps(report, indent=2))
+    click.echo(f'Saved the results to {output}.', err=True)
+    if baseline is not None:
+        compare(report, json.loads(Path(baseline).read_text()))
+
+
+if __name__ == '__main__':
+    main()
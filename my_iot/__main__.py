@@ -8,12 +8,12 @@ import click
 import pkg_resources
 from aiohttp.web import Application
 from loguru import logger
-from sqlitemap import Connection
 
-from my_iot import web
-from my_iot.constants import DATABASE_OPTIONS
+from my_iot import database, web
+from my_iot.constants import READER_POOL_SIZE, TEMPLATE_CACHE_PATH
 from my_iot.imp_ import create_module
 from my_iot.logging_ import init_logging
+from my_iot.pool import ReaderPool
 from my_iot.types_ import Event, Unit
 from my_iot.web import Context
 
@@ -35,15 +35,40 @@ def option(*args, **kwargs):
     envvar='MY_IOT_VERBOSITY',
     help='Logging verbosity.',
 )
-def main(automation_path: str, verbosity: int):
+@option(
+    'data_path', '--data-path',
+    envvar='MY_IOT_DATA_PATH',
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    default='.',
+    help='Directory of the database and the caches.',
+)
+@option(
+    'rebuild_rollups', '--rebuild-rollups',
+    is_flag=True,
+    envvar='MY_IOT_REBUILD_ROLLUPS',
+    help='Rebuild the float channel rollups from the logs and exit.',
+)
+def main(automation_path: str, verbosity: int, data_path: str, rebuild_rollups: bool):
     """
     Yet another home automation service.
     """
     init_logging(verbosity)
+    database_path = str(Path(data_path) / 'db.sqlite3')
+    db = database.open_database(database_path)
+    if rebuild_rollups:
+        logger.info('Rebuilding rollups…')
+        logger.info('Rebuilt rollups of {} channels.', database.rebuild_rollups(db))
+        db.close()
+        return
     logger.info('Starting My IoT…')
     automation = import_automation(Path(automation_path))
-    db = Connection('db.sqlite3', **DATABASE_OPTIONS)
-    web.start(Context(db=db, automation=automation), on_startup, on_cleanup)
+    readers = ReaderPool(database_path, READER_POOL_SIZE)
+    web.start(
+        Context(db=db, readers=readers, automation=automation),
+        on_startup,
+        on_cleanup,
+        str(Path(data_path) / TEMPLATE_CACHE_PATH),
+    )
     logger.info('My IoT stopped.')
 
 
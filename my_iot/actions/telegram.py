@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+from asyncio import CancelledError, Future, Task, create_task, get_running_loop, sleep
+from collections import deque
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Deque, Dict, List, Optional, Set
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession
 from loguru import logger
 
+from my_iot.helpers import TokenBucket
+
 url = 'https://api.telegram.org/bot{token}/{method}'
 
+# Telegram allows about 30 messages per second in total and about a message per second in a single chat.
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+
+MAX_MESSAGE_LENGTH = 4096
+MAX_ATTEMPTS = 5
+
+# Used when a rate limited response doesn't tell the delay, in seconds.
+DEFAULT_RETRY_AFTER = 1.0
+
 
 class ParseMode(str, Enum):
     MARKDOWN = 'Markdown'
@@ -15,8 +31,12 @@ class ParseMode(str, Enum):
 
 
 async def post(session: ClientSession, token: str, method: str, data: Dict[Any, Any]) -> ClientResponse:
+    """
+    Call the method. The response is read and released, so that its connection goes back to the pool.
+    """
     logger.info('{}', method)
-    response: ClientResponse = await session.post(url.format(token=token, method=method), data=data)
+    async with session.post(url.format(token=token, method=method), data=data) as response:
+        await response.read()
     if response.status != 200:
         logger.error('Telegram error: {}', await response.text())
     return response
@@ -31,6 +51,18 @@ async def send_message(
     disable_web_page_preview: bool = False,
     disable_notification: bool = False,
 ):
+    logger.debug('send_message(text={!r})', text)
+    data = make_message_data(chat_id, text, parse_mode, disable_web_page_preview, disable_notification)
+    return await post(session, token, 'sendMessage', data)
+
+
+def make_message_data(
+    chat_id: str,
+    text: str,
+    parse_mode: Optional[ParseMode],
+    disable_web_page_preview: bool,
+    disable_notification: bool,
+) -> Dict[str, Any]:
     data = {
         'chat_id': chat_id,
         'text': text,
@@ -39,8 +71,7 @@ async def send_message(
     }
     if parse_mode:
         data['parse_mode'] = parse_mode.value
-    logger.debug('send_message(text={!r})', text)
-    return await post(session, token, 'sendMessage', data)
+    return data
 
 
 async def send_animation(
@@ -52,6 +83,18 @@ async def send_animation(
     parse_mode: Optional[ParseMode] = None,
     disable_notification: bool = False,
 ) -> ClientResponse:
+    logger.debug('send_animation(animation={!r})', animation)
+    data = make_animation_data(chat_id, animation, caption, parse_mode, disable_notification)
+    return await post(session, token, 'sendAnimation', data)
+
+
+def make_animation_data(
+    chat_id: str,
+    animation: str,
+    caption: Optional[str],
+    parse_mode: Optional[ParseMode],
+    disable_notification: bool,
+) -> Dict[str, Any]:
     data = {
         'chat_id': chat_id,
         'animation': animation,
@@ -61,5 +104,152 @@ async def send_animation(
         data['caption'] = caption
     if parse_mode:
         data['parse_mode'] = parse_mode.value
-    logger.debug('send_animation(animation={!r})', animation)
-    return await post(session, token, 'sendAnimation', data)
+    return data
+
+
+@dataclass
+class Outgoing:
+    """
+    Method call waiting to be sent, along with the futures of all the calls merged into it.
+    """
+
+    session: ClientSession
+    method: str
+    data: Dict[str, Any]
+    futures: List[Future]
+
+    def merge(self, method: str, data: Dict[str, Any]) -> bool:
+        """
+        Append the text of the other message, if it's possible. Returns `False` otherwise.
+        """
+        if method != 'sendMessage' or self.method != 'sendMessage':
+            return False
+        if any(data.get(key) != self.data.get(key) for key in data.keys() | self.data.keys() if key != 'text'):
+            return False
+        text = f'{self.data["text"]}\n\n{data["text"]}'
+        if len(text) > MAX_MESSAGE_LENGTH:
+            return False
+        self.data['text'] = text
+        return True
+
+
+class Outbox:
+    """
+    Sends the messages in the background, so that the handlers don't wait for Telegram.
+
+    Keeps within the global and the per-chat rate limits. Text messages that are waiting to be sent to the same chat
+    are merged into one. Calls that are rejected because of the rate limits are retried after the requested delay.
+    """
+
+    def __init__(self, token: str, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE):
+        self.token = token
+        self.chat_rate = chat_rate
+        self.bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self.queues: Dict[str, Deque[Outgoing]] = {}
+        self.workers: Set[Task] = set()
+
+    def send_message(
+        self,
+        session: ClientSession,
+        chat_id: str,
+        text: str,
+        parse_mode: Optional[ParseMode] = None,
+        disable_web_page_preview: bool = False,
+        disable_notification: bool = False,
+    ) -> Future:
+        """
+        Queue the message. Returns a future of the response, which is `None` if all the attempts have failed.
+        """
+        data = make_message_data(chat_id, text, parse_mode, disable_web_page_preview, disable_notification)
+        return self.put(session, 'sendMessage', data)
+
+    def send_animation(
+        self,
+        session: ClientSession,
+        chat_id: str,
+        animation: str,
+        caption: Optional[str] = None,
+        parse_mode: Optional[ParseMode] = None,
+        disable_notification: bool = False,
+    ) -> Future:
+        """
+        Queue the animation. Returns a future of the response, which is `None` if all the attempts have failed.
+        """
+        data = make_animation_data(chat_id, animation, caption, parse_mode, disable_notification)
+        return self.put(session, 'sendAnimation', data)
+
+    def put(self, session: ClientSession, method: str, data: Dict[str, Any]) -> Future:
+        future = get_running_loop().create_future()
+        chat_id = str(data['chat_id'])
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = deque()
+            worker = create_task(self.run_chat(chat_id, queue))
+            self.workers.add(worker)
+            worker.add_done_callback(self.workers.discard)
+        if queue and queue[-1].session is session and queue[-1].merge(method, data):
+            queue[-1].futures.append(future)
+        else:
+            queue.append(Outgoing(session, method, data, [future]))
+        return future
+
+    async def run_chat(self, chat_id: str, queue: Deque[Outgoing]):
+        """
+        Send the queued calls of the chat one by one until the queue is empty.
+        A call that fails doesn't stop the others, its futures get the error.
+        """
+        bucket = self.chat_buckets.setdefault(chat_id, TokenBucket(self.chat_rate))
+        outgoing: Optional[Outgoing] = None
+        try:
+            while queue:
+                outgoing = queue.popleft()  # so that nothing is merged into the call being sent
+                try:
+                    response = await self.call(outgoing, bucket)
+                except CancelledError:
+                    raise
+                except Exception as e:
+                    logger.opt(exception=e).error('Failed to call `{}`.', outgoing.method)
+                    for future in outgoing.futures:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for future in outgoing.futures:
+                        if not future.done():
+                            future.set_result(response)
+        finally:
+            del self.queues[chat_id]
+            # Only unresolved when the worker is cancelled, so that nobody waits for them forever.
+            for outgoing in [outgoing, *queue] if outgoing is not None else queue:
+                for future in outgoing.futures:
+                    future.cancel()
+
+    async def call(self, outgoing: Outgoing, bucket: TokenBucket) -> Optional[ClientResponse]:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await bucket.acquire()
+            await self.bucket.acquire()
+            try:
+                response = await post(outgoing.session, self.token, outgoing.method, outgoing.data)
+            except (ClientError, asyncio.TimeoutError) as e:
+                logger.warning('Attempt #{} to call `{}` has failed: {}', attempt, outgoing.method, e)
+                if attempt < MAX_ATTEMPTS:
+                    await sleep(2.0 ** attempt)
+                continue
+            if response.status != 429:
+                return response
+            retry_after = await get_retry_after(response)
+            logger.warning('Telegram asks to retry in {} seconds.', retry_after)
+            bucket.pause(retry_after)
+        logger.error('Failed to call `{}` in {} attempts.', outgoing.method, MAX_ATTEMPTS)
+        return None
+
+
+async def get_retry_after(response: ClientResponse) -> float:
+    """
+    Get the delay requested by the rate limited response. The body isn't necessarily JSON.
+    """
+    try:
+        body = await response.json(content_type=None)
+        return float(body['parameters']['retry_after'])
+    except (ClientError, ValueError, TypeError, KeyError):
+        return DEFAULT_RETRY_AFTER
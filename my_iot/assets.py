@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import gzip
+import mimetypes
+from dataclasses import dataclass, field
+from hashlib import sha256
+from typing import Dict, Optional
+
+from pkg_resources import resource_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types which are unknown to `mimetypes` on some platforms.
+CONTENT_TYPES = {
+    '.ico': 'image/x-icon',
+    '.webmanifest': 'application/manifest+json',
+}
+
+
+@dataclass
+class Asset:
+    """
+    Static file along with its precompressed versions.
+    """
+
+    body: bytes
+    content_type: str
+
+    # Precompressed bodies by content encoding. Only those that are noticeably smaller than the original are kept.
+    encodings: Dict[str, bytes] = field(init=False, default_factory=dict)
+
+    etag: str = field(init=False)
+
+    def __post_init__(self):
+        self.etag = f'"{sha256(self.body).hexdigest()[:16]}"'
+        candidates = {'gzip': gzip.compress(self.body, 9)}
+        if brotli is not None:
+            candidates['br'] = brotli.compress(self.body)
+        self.encodings = {encoding: body for encoding, body in candidates.items() if len(body) < 0.9 * len(self.body)}
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """
+        Choose the most preferred precompressed version which the client accepts, the smallest one of those.
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        qualities = {encoding: accepted.get(encoding, accepted.get('*', 0.0)) for encoding in self.encodings}
+        encodings = [encoding for encoding, quality in qualities.items() if quality > 0.0]
+        return min(
+            encodings,
+            key=lambda encoding: (-qualities[encoding], len(self.encodings[encoding])),
+            default=None,
+        )
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Get the quality values by the content codings. Codings with an invalid quality are skipped.
+    """
+    accepted: Dict[str, float] = {}
+    for item in header.lower().split(','):
+        coding, *parameters = (part.strip() for part in item.split(';'))
+        if not coding:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def load_asset(name: str) -> Asset:
+    suffix = name[name.rfind('.'):]
+    content_type = CONTENT_TYPES.get(suffix) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    return Asset(resource_string('my_iot', f'static/{name}'), content_type)
+
+
+ASSETS = {
+    name: load_asset(name)
+    for name in [
+        'android-chrome-192x192.png',
+        'android-chrome-512x512.png',
+        'apple-touch-icon.png',
+        'favicon.ico',
+        'favicon-16x16.png',
+        'favicon-32x32.png',
+        'site.webmanifest',
+    ]
+}
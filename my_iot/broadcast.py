@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import re
+from asyncio import Event as Signal
+from collections import OrderedDict, deque
+from typing import Deque, Iterator, List, Optional, Pattern, Set, Tuple
+
+from loguru import logger
+
+from my_iot.types_ import Event
+
+# Published event along with its sequence number.
+Item = Tuple[int, Event]
+
+
+class Subscriber:
+    """
+    Receives the published events of the matching channels.
+
+    Pending events are coalesced per channel, so that only the latest value of a channel waits to be sent.
+    The subscriber is closed once the number of pending channels exceeds the limit.
+    """
+
+    def __init__(self, channel_regex: Optional[Pattern], max_size: int, since: int):
+        self.channel_regex = channel_regex
+        self.max_size = max_size
+
+        # Sequence number of the last event published before the subscription.
+        # The later events are delivered via the pending ones rather than the recent ones.
+        self.since = since
+
+        self.pending: OrderedDict[str, Item] = OrderedDict()
+        self.signal = Signal()
+        self.is_closed = False
+
+    def matches(self, channel: str) -> bool:
+        return self.channel_regex is None or bool(self.channel_regex.fullmatch(channel))
+
+    def put(self, item: Item) -> bool:
+        """
+        Put the event without waiting. Returns `False` if the subscriber has been closed because of the overflow.
+        """
+        channel = item[1].channel
+        if channel not in self.pending and len(self.pending) >= self.max_size:
+            self.close()
+            return False
+        self.pending.pop(channel, None)  # the coalesced event goes to the end
+        self.pending[channel] = item
+        self.signal.set()
+        return True
+
+    async def get(self) -> List[Item]:
+        """
+        Wait for the pending events and take all of them.
+        Returns an empty list once the subscriber is closed.
+        """
+        await self.signal.wait()
+        self.signal.clear()
+        if self.is_closed:
+            return []
+        items = list(self.pending.values())
+        self.pending.clear()
+        return items
+
+    def close(self):
+        self.is_closed = True
+        self.pending.clear()
+        self.signal.set()
+
+
+class Broadcaster:
+    """
+    Fans the events out to the subscribers without ever waiting for them.
+    Keeps the recent events, so that a new subscriber may catch up.
+    """
+
+    def __init__(self, history_size: int, subscriber_buffer_size: int):
+        self.subscriber_buffer_size = subscriber_buffer_size
+        self.recent: Deque[Item] = deque(maxlen=history_size)
+        self.subscribers: Set[Subscriber] = set()
+        self.sequence = 0
+
+    def publish(self, event: Event):
+        self.sequence += 1
+        item = (self.sequence, event)
+        self.recent.append(item)
+        for subscriber in list(self.subscribers):
+            if subscriber.matches(event.channel) and not subscriber.put(item):
+                logger.warning('Dropped a slow subscriber.')
+                self.subscribers.discard(subscriber)
+
+    def subscribe(self, channel: Optional[str] = None) -> Subscriber:
+        """
+        Subscribe to the channels which fully match the regular expression, or to all channels by default.
+        """
+        subscriber = Subscriber(re.compile(channel) if channel else None, self.subscriber_buffer_size, self.sequence)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        self.subscribers.discard(subscriber)
+
+    def iter_recent(self, subscriber: Subscriber, after: int = 0) -> Iterator[Item]:
+        """
+        Iterate over the recent events of the subscribed channels with the sequence number greater than `after`.
+        Only the events published before the subscription are included, so that none is sent twice.
+        """
+        return (
+            item for item in self.recent
+            if after < item[0] <= subscriber.since and subscriber.matches(item[1].channel)
+        )
+
+    def close(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.subscribers.clear()
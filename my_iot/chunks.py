@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+
+from my_iot.constants import CHUNK_DURATION
+from my_iot.types_ import Event
+
+# Float readings of a channel are packed into fixed-time chunks.
+# Each chunk is stored as a pair of packed little-endian double arrays: timestamps and values.
+Columns = Tuple[memoryview, memoryview]
+
+IS_LITTLE_ENDIAN = sys.byteorder == 'little'
+CHUNK_SECONDS = CHUNK_DURATION.total_seconds()
+
+
+def is_chunked(event: Event) -> bool:
+    """
+    Tells whether the event is logged to a chunk rather than to a plain log collection.
+    """
+    return event.unit.is_float and isinstance(event.value, (int, float)) and not isinstance(event.value, bool)
+
+
+def get_chunk_start(timestamp: float) -> datetime:
+    """
+    Get start time of the chunk which contains the timestamp.
+    """
+    return datetime.fromtimestamp(timestamp - timestamp % CHUNK_SECONDS, timezone.utc)
+
+
+class Chunk:
+    """
+    Mutable chunk that is used to append readings.
+    """
+
+    def __init__(self, timestamps: Optional[array] = None, values: Optional[array] = None):
+        self.timestamps = timestamps if timestamps is not None else array('d')
+        self.values = values if values is not None else array('d')
+
+    @classmethod
+    def from_raw(cls, raw: Optional[Any]) -> Chunk:
+        if raw is None:
+            return Chunk()
+        timestamps, values = array('d', raw[0]), array('d', raw[1])
+        if not IS_LITTLE_ENDIAN:
+            timestamps.byteswap()
+            values.byteswap()
+        return Chunk(timestamps, values)
+
+    def to_raw(self) -> Any:
+        timestamps, values = self.timestamps, self.values
+        if not IS_LITTLE_ENDIAN:
+            timestamps, values = array('d', timestamps), array('d', values)
+            timestamps.byteswap()
+            values.byteswap()
+        return [timestamps.tobytes(), values.tobytes()]
+
+    def insert(self, timestamp: float, value: float) -> Optional[float]:
+        """
+        Insert the reading keeping the timestamps sorted.
+        A reading with an already existing timestamp replaces the old one, just like a log collection does.
+        Returns the replaced value, if any.
+        """
+        if not self.timestamps or self.timestamps[-1] < timestamp:
+            # This is by far the most common case.
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+            return None
+        index = bisect_left(self.timestamps, timestamp)
+        if self.timestamps[index] == timestamp:
+            previous, self.values[index] = self.values[index], value
+            return previous
+        self.timestamps.insert(index, timestamp)
+        self.values.insert(index, value)
+        return None
+
+    def remove(self, timestamp: float) -> Optional[float]:
+        """
+        Remove the reading with the timestamp. Returns the removed value, if any.
+        """
+        index = bisect_left(self.timestamps, timestamp)
+        if index == len(self.timestamps) or self.timestamps[index] != timestamp:
+            return None
+        del self.timestamps[index]
+        return self.values.pop(index)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+def decode_columns(raw: Any) -> Columns:
+    """
+    Get the chunk columns. Does not copy the data on little-endian machines.
+    """
+    if not IS_LITTLE_ENDIAN:
+        chunk = Chunk.from_raw(raw)
+        return memoryview(chunk.timestamps), memoryview(chunk.values)
+    return memoryview(raw[0]).cast('d'), memoryview(raw[1]).cast('d')
+
+
+def slice_columns(columns: Columns, since: Optional[float] = None, until: Optional[float] = None) -> Columns:
+    """
+    Slice the columns so that `since <= timestamp < until`.
+    """
+    timestamps, values = columns
+    start = bisect_left(timestamps, since) if since is not None else 0
+    stop = bisect_left(timestamps, until) if until is not None else len(timestamps)
+    return timestamps[start:stop], values[start:stop]
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from math import inf
+from typing import Dict, Iterable, Mapping, Optional, Pattern, Tuple
+
+from my_iot.types_ import Unit
+
+# Reading as `(timestamp, value)`.
+Point = Tuple[float, float]
+
+# Number of the latest removed readings of a channel which are remembered, so that a rewritten one isn't counted twice.
+REMOVED_HISTORY_SIZE = 100
+
+
+@dataclass
+class Compression:
+    """
+    Tells which readings of the matching float channels may be left out of the log.
+    The stored readings still describe the channel within the tolerance.
+    """
+
+    # Regular expression which the channel must fully match.
+    channel: str = '.*'
+
+    # Unit which the channel must have. Any unit matches by default.
+    unit: Optional[Unit] = None
+
+    # Maximum difference between a left out reading and the line through the stored ones.
+    tolerance: float = 0.0
+
+    # Use the swinging door trending algorithm. Otherwise, readings that are within the tolerance
+    # of the latest kept one are left out, and the tolerance only holds for the step-like series.
+    swinging_door: bool = True
+
+    channel_regex: Pattern = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.channel_regex = re.compile(self.channel)
+
+    def matches(self, channel: str, unit: Optional[Unit]) -> bool:
+        return (self.unit is None or self.unit == unit) and bool(self.channel_regex.fullmatch(channel))
+
+
+class Door:
+    """
+    Compression state of a single channel.
+
+    The latest reading is always stored, so that the log ends with the actual value.
+    Instead of waiting for the next reading, the previously stored one is removed if it turns out to be redundant.
+    """
+
+    __slots__ = ('policy', 'archived', 'held', 'upper', 'lower', 'removed')
+
+    def __init__(self, policy: Compression):
+        self.policy = policy
+        self.archived: Optional[Point] = None  # the latest reading which must be kept
+        self.held: Optional[Point] = None  # the latest reading which may still be removed
+
+        # Slopes of the door which is hinged at the archived reading.
+        # Any line from the archived reading within the door passes within the tolerance of the left out readings.
+        self.upper = inf
+        self.lower = -inf
+
+        # Values of the latest removed readings by their timestamps.
+        self.removed: OrderedDict[float, float] = OrderedDict()
+
+    def copy(self) -> Door:
+        door = Door(self.policy)
+        door.archived, door.held, door.upper, door.lower = self.archived, self.held, self.upper, self.lower
+        door.removed = OrderedDict(self.removed)
+        return door
+
+    def add(self, timestamp: float, value: float) -> Optional[float]:
+        """
+        Add the stored reading.
+        Returns the timestamp of the reading that should be removed, if any.
+        """
+        archived, held = self.archived, self.held
+        if archived is None or timestamp <= (held or archived)[0]:
+            self.reset((timestamp, value))  # the first or an out-of-order reading
+            return None
+        tolerance = self.policy.tolerance
+
+        if not self.policy.swinging_door:
+            if abs(value - archived[1]) > tolerance:
+                self.reset((timestamp, value))
+                return None
+            self.held = (timestamp, value)
+            return self.remove(held)
+
+        duration = timestamp - archived[0]
+        if self.lower <= (value - archived[1]) / duration <= self.upper:
+            # The line to the new reading passes within the tolerance of the readings in between.
+            self.upper = min(self.upper, (value + tolerance - archived[1]) / duration)
+            self.lower = max(self.lower, (value - tolerance - archived[1]) / duration)
+            self.held = (timestamp, value)
+            return self.remove(held)
+
+        # The door is open now, so the held reading is kept and the door is hinged at it.
+        assert held is not None, 'the door may only open after the second reading'
+        duration = timestamp - held[0]
+        self.archived, self.held = held, (timestamp, value)
+        self.upper = (value + tolerance - held[1]) / duration
+        self.lower = (value - tolerance - held[1]) / duration
+        return None
+
+    def remove(self, point: Optional[Point]) -> Optional[float]:
+        if point is None:
+            return None
+        self.removed[point[0]] = point[1]
+        if len(self.removed) > REMOVED_HISTORY_SIZE:
+            self.removed.popitem(last=False)
+        return point[0]
+
+    def reset(self, point: Optional[Point]):
+        self.archived, self.held, self.upper, self.lower = point, None, inf, -inf
+
+
+class Compressor:
+    """
+    Keeps compression state of the channels.
+    The state lives in memory only, so after a restart just a few redundant readings are kept.
+
+    A transaction works with a `fork`, which is only merged back once the transaction is committed.
+    """
+
+    def __init__(self, policies: Iterable[Compression], base: Optional[Mapping[str, Optional[Door]]] = None):
+        self.policies = list(policies)
+        self.doors: Dict[str, Optional[Door]] = {}
+
+        # Doors of the parent compressor, which are copied before being changed.
+        self.base = base if base is not None else {}
+
+    def get_door(self, channel: str, unit: Unit) -> Optional[Door]:
+        try:
+            return self.doors[channel]
+        except KeyError:
+            pass
+        if channel in self.base:
+            door = self.base[channel]
+            door = door.copy() if door is not None else None
+        else:
+            policy = next((policy for policy in self.policies if policy.matches(channel, unit)), None)
+            door = Door(policy) if policy is not None else None
+        self.doors[channel] = door
+        return door
+
+    def add(self, channel: str, unit: Unit, timestamp: float, value: float) -> Optional[float]:
+        """
+        Add the stored reading of the channel.
+        Returns the timestamp of the reading that should be removed, if any.
+        """
+        door = self.get_door(channel, unit)
+        return door.add(timestamp, value) if door is not None else None
+
+    def pop_removed(self, channel: str, unit: Unit, timestamp: float) -> Optional[float]:
+        """
+        Get the value of the removed reading, if it's remembered, and forget it.
+        """
+        door = self.get_door(channel, unit)
+        return door.removed.pop(timestamp, None) if door is not None else None
+
+    def forget(self, channel: str, unit: Unit):
+        """
+        Drop the channel state, so that none of the already stored readings is removed.
+        """
+        door = self.get_door(channel, unit)
+        if door is not None:
+            door.reset(None)
+
+    def fork(self) -> Compressor:
+        """
+        Get the compressor which changes copies of the doors.
+        """
+        return Compressor(self.policies, self.doors)
+
+    def merge(self, fork: Compressor):
+        """
+        Apply the fork changes.
+        """
+        self.doors.update(fork.doors)
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
+import os
 from datetime import timedelta
 
 import umsgpack
 from aiohttp import ClientTimeout
-from pkg_resources import resource_string
 
 LOGURU_FORMAT = ' '.join((
     '<green>{time:MMM DD HH:mm:ss}</green>',
@@ -27,25 +27,77 @@ ACTUAL_KEY = 'actual'
 HTTP_PORT = 8080
 HTTP_TIMEOUT = ClientTimeout(total=10.0)
 
+# Shared pool of the outgoing HTTP connections.
+HTTP_CONNECTION_LIMIT = 100
+HTTP_CONNECTION_LIMIT_PER_HOST = 10
+HTTP_DNS_CACHE_TTL = 300  # seconds
+
 DATABASE_OPTIONS = {
     'dumps_': umsgpack.packb,
     'loads_': umsgpack.unpackb,
     'check_same_thread': False,
 }
 
-STATICS = {
-    name: resource_string('my_iot', f'static/{name}')
-    for name in [
-        'android-chrome-192x192.png',
-        'android-chrome-512x512.png',
-        'apple-touch-icon.png',
-        'favicon.ico',
-        'favicon-16x16.png',
-        'favicon-32x32.png',
-        'site.webmanifest',
-    ]  # TODO: should go to `constants`.
-}
+# Static files aren't fingerprinted, so they're revalidated by their ETag once a day.
+STATIC_CACHE_CONTROL = 'public, max-age=86400'
+
+# Compiled templates are kept here between restarts, relative to the data directory.
+TEMPLATE_CACHE_PATH = '.cache/templates'
+
+# Number of connections used by the web handlers to read the database.
+READER_POOL_SIZE = min(os.cpu_count() or 1, 4)
+
+# Maximum number of events waiting to be processed.
+QUEUE_SIZE = 1000
+
+# Maximum number of events whose handlers are running at once.
+MAX_ROUTING_TASKS = 1000
+
+# Number of recent events sent to a new live event subscriber.
+RECENT_EVENTS_SIZE = 100
+
+# Maximum number of channels waiting to be sent to a live event subscriber before it's dropped.
+SUBSCRIBER_BUFFER_SIZE = 100
+
+# How often a comment is sent to an idle live event subscriber, so that proxies don't close the connection.
+KEEPALIVE_INTERVAL = timedelta(seconds=15)
+
+# Traced events which take longer than this are considered slow.
+TRACE_THRESHOLD = timedelta(seconds=1)
+
+# Number of the recent slow traces shown on the debug page.
+TRACE_HISTORY_SIZE = 100
+
+# The trace file is rotated once it exceeds the size.
+TRACE_MAX_BYTES = 1024 * 1024
+TRACE_BACKUP_COUNT = 3
 
 DEFAULT_PERIOD = timedelta(minutes=5)
 
 MAX_CHART_POINTS = 500
+
+# Maximum number of readings read from the database at once when streaming a log.
+LOG_PAGE_SIZE = 5000
+
+# Time span of a single chunk of float readings.
+CHUNK_DURATION = timedelta(hours=1)
+
+# Readings of the latest chunk are appended to its segments, so that the whole chunk isn't rewritten every time.
+# A transaction starts a new segment when the latest one has got this number of readings.
+CHUNK_SEGMENT_SIZE = 100
+
+# Resolutions of the float channel aggregates, from the finest to the coarsest.
+ROLLUP_RESOLUTIONS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# How often the expired log items are deleted.
+COMPACTION_INTERVAL = timedelta(hours=1)
+
+# Maximum number of items deleted in a single transaction, so that the compaction doesn't stall event writes.
+COMPACTION_BATCH_SIZE = 500
+
+# Maximum number of free pages returned to the file system in a single step.
+VACUUM_BATCH_SIZE = 1000
@@ -1,23 +1,49 @@
 from __future__ import annotations
 
 import asyncio
-from asyncio import CancelledError, create_task, gather, sleep
+from asyncio import CancelledError, Future, Semaphore, Task, create_task, gather, get_running_loop, shield, sleep
 from contextlib import suppress
 from dataclasses import InitVar, dataclass, field
 from datetime import timedelta
-from types import ModuleType
-from typing import Iterable
+from functools import partial
+from time import perf_counter
+from types import MappingProxyType, ModuleType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TypeVar
 
 from aiohttp import ClientConnectorError, ClientSession
 from loguru import logger
 from sqlitemap import Connection
 
-from my_iot.constants import ACTUAL_KEY, HTTP_TIMEOUT
-from my_iot.database import get_actual, save_event
-from my_iot.helpers import run_in_executor
+from my_iot.broadcast import Broadcaster
+from my_iot.compression import Compression, Compressor
+from my_iot.constants import (
+    COMPACTION_INTERVAL,
+    MAX_ROUTING_TASKS,
+    QUEUE_SIZE,
+    RECENT_EVENTS_SIZE,
+    SUBSCRIBER_BUFFER_SIZE,
+    TRACE_THRESHOLD,
+)
+from my_iot.database import get_actual
+from my_iot.http_ import HttpClients
+from my_iot.metrics import (
+    Value,
+    events_total,
+    read_seconds,
+    service_backoff_seconds,
+    service_errors,
+    service_restarts_total,
+)
+from my_iot.pool import ReaderPool
+from my_iot.queue_ import EventQueue, Overflow
+from my_iot.retention import Retention, compact
 from my_iot.routing import router
 from my_iot.services.base import Service
+from my_iot.tracing import Trace, Tracer
 from my_iot.types_ import Event
+from my_iot.writer import EventWriter
+
+T = TypeVar('T')
 
 
 # FIXME: should be named `Runner`.
@@ -26,25 +52,106 @@ class Context:
     # User-defined automation.
     automation: InitVar[ModuleType]
 
-    # Database connection.
+    # Database connection. Used for writing only unless the reader pool is missing.
     db: Connection
 
+    # Connections for the web handlers.
+    readers: Optional[ReaderPool] = None
+
     # User-defined services.
     services: Iterable[Service] = field(default_factory=list)
 
-    # HTTP client session for user's automation needs.
-    session: ClientSession = field(default_factory=lambda: ClientSession(timeout=HTTP_TIMEOUT))
+    # HTTP client sessions for the services and user's automation needs.
+    http: HttpClients = field(default_factory=HttpClients)
+
+    # Maximum number of events saved in a single transaction. Default is to save each event immediately.
+    write_batch_size: int = 1
+
+    # Maximum time an event may wait to be saved.
+    write_batch_delay: timedelta = timedelta()
+
+    # Compression policies of the float channels. The first one that matches a channel is applied.
+    compression: List[Compression] = field(default_factory=list)
+
+    # Maximum number of events waiting to be processed and what to do when there's no more room.
+    queue_size: int = QUEUE_SIZE
+    queue_overflow: Overflow = Overflow.BLOCK
+
+    # Number of events processed concurrently. Default is the write batch size, so that a batch can be filled.
+    queue_workers: Optional[int] = None
+
+    # Log retention policies. The first one that matches a channel is applied.
+    retention: List[Retention] = field(default_factory=list)
+
+    # Share of the events which are traced through the pipeline, from `0.0` (default) to `1.0`.
+    trace_sample_rate: float = 0.0
+
+    # Traces which take longer than the threshold are kept and written to the JSON Lines file, if specified.
+    trace_threshold: timedelta = TRACE_THRESHOLD
+    trace_path: Optional[str] = None
+
+    # Bounded queue between the services and the event pipeline.
+    queue: EventQueue = field(init=False)
+
+    # Traces of the sampled events.
+    tracer: Tracer = field(init=False)
+
+    # Live events for the web clients.
+    broadcaster: Broadcaster = field(init=False)
+
+    # Write-behind stage in front of the database.
+    writer: EventWriter = field(init=False)
+
+    # Actual channel values. Loaded once and then updated as soon as the events are committed.
+    actual: Dict[str, Event] = field(init=False)
+
+    # Maximum number of events being routed at once. The workers wait for a free slot.
+    max_routing_tasks: int = MAX_ROUTING_TASKS
+
+    # Event routing tasks which haven't finished yet.
+    routing_tasks: Set[Task] = field(init=False, default_factory=set)
+    routing_limit: Semaphore = field(init=False)
 
     def __post_init__(self, automation: ModuleType):
         self.services = getattr(automation, 'SERVICES', self.services)
+        for service in self.services:
+            service.http = self.http
+        self.write_batch_size = getattr(automation, 'WRITE_BATCH_SIZE', self.write_batch_size)
+        self.write_batch_delay = getattr(automation, 'WRITE_BATCH_DELAY', self.write_batch_delay)
+        self.retention = getattr(automation, 'RETENTION', self.retention)
+        self.compression = getattr(automation, 'COMPRESSION', self.compression)
+        self.queue_size = getattr(automation, 'QUEUE_SIZE', self.queue_size)
+        self.queue_overflow = getattr(automation, 'QUEUE_OVERFLOW', self.queue_overflow)
+        self.queue_workers = getattr(automation, 'QUEUE_WORKERS', self.queue_workers)
+        if self.queue_workers is None:
+            self.queue_workers = max(self.write_batch_size, 1)
+        self.trace_sample_rate = getattr(automation, 'TRACE_SAMPLE_RATE', self.trace_sample_rate)
+        self.trace_threshold = getattr(automation, 'TRACE_THRESHOLD', self.trace_threshold)
+        self.trace_path = getattr(automation, 'TRACE_PATH', self.trace_path)
+        self.max_routing_tasks = getattr(automation, 'MAX_ROUTING_TASKS', self.max_routing_tasks)
+        self.queue = EventQueue(self.queue_size, self.queue_overflow)
+        self.routing_limit = Semaphore(self.max_routing_tasks)
+        self.tracer = Tracer(self.trace_sample_rate, self.trace_threshold, self.trace_path)
+        self.broadcaster = Broadcaster(RECENT_EVENTS_SIZE, SUBSCRIBER_BUFFER_SIZE)
+        self.writer = EventWriter(
+            self.db,
+            self.write_batch_size,
+            self.write_batch_delay,
+            Compressor(self.compression) if self.compression else None,
+        )
+        self.actual = dict(get_actual(self.db))
 
     async def run_services(self):
         """
         Run all services.
         """
         logger.info('Running services…')
+        tasks = [self.run_service(service) for service in self.services]
+        tasks.extend(self.run_worker() for _ in range(self.queue_workers))
+        if self.retention:
+            tasks.append(self.run_compaction())
         try:
-            await gather(*[self.run_service(service) for service in self.services])
+            await gather(*tasks)
         except CancelledError:
             for service in self.services:
                 with suppress(Exception):
@@ -57,13 +164,23 @@ class Context:
         """
         Run the single service.
         """
+        name = str(service)
+        counters: Dict[str, Value] = {}  # event counters by channel
+        errors = service_errors.labels(name)
+        backoff = service_backoff_seconds.labels(name)
+        restarts = service_restarts_total.labels(name)
         n_errors = 0
         while True:
             logger.info('Running {}…', service)
             try:
                 async for event in service.events:
                     n_errors = 0  # the service successfully generated an event
-                    await self.on_event(event)
+                    counter = counters.get(event.channel)
+                    if counter is None:
+                        counter = counters[event.channel] = events_total.labels(name, event.channel)
+                    counter.inc()
+                    if not await self.queue.put(event, str(service)):
+                        logger.warning('Dropped `{}` from {}: the queue is full.', event.channel, service)
             except CancelledError:
                 logger.info('Stopped service {}.', service)
                 break
@@ -75,27 +192,132 @@ class Context:
                     logger.opt(exception=e).error('{} has failed.', service)
             else:
                 n_errors = 0  # the service has finished normally
+            errors.set(n_errors)
             if n_errors:
                 delay = 2.0 ** min(n_errors, 16)
                 logger.error('{} errors. Restarting in {}…', n_errors, timedelta(seconds=delay))
+                backoff.set(delay)
                 await sleep(delay)
+                backoff.set(0.0)
+                restarts.inc()
+
+    async def run_worker(self):
+        """
+        Process the queued events one by one.
+        """
+        while True:
+            event = await self.queue.get()
+            try:
+                await self.on_event(event)
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.opt(exception=e).error('Failed to process `{}`.', event.channel)
+
+    async def run_compaction(self):
+        """
+        Periodically delete the expired log items according to the retention policies.
+        """
+        while True:
+            await sleep(COMPACTION_INTERVAL.total_seconds())
+            logger.info('Compacting the database…')
+            try:
+                n_deleted, n_bytes = await compact(self.writer, self.retention, self.actual)
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.opt(exception=e).error('Compaction has failed.')
+            else:
+                logger.info('Deleted {} items and reclaimed {} bytes.', n_deleted, n_bytes)
 
     async def on_event(self, event: Event):
         """
-        Handle the single event.
+        Handle the single event. Returns once the event is saved, the handlers are called in the background.
         """
         logger.info('{key} = {value!r}', key=event.channel, value=event.value)
-        previous = self.db[ACTUAL_KEY].get(event.channel)
-        await run_in_executor(save_event, self.db, event)
-        previous = Event(**previous) if previous is not None else None
-        # noinspection PyAsyncCall
-        create_task(router.on_event(
-            event=event,
-            previous=previous,
-            actual=(await run_in_executor(get_actual, self.db)),
-            session=self.session,
-        ))
+        trace = self.tracer.start(event)
+        saved = self.writer.put(event)
+        # Done callbacks run in order, so the actual value is updated before the routing goes on.
+        applied = get_running_loop().create_future()
+        saved.add_done_callback(partial(self.on_saved, event, applied))
+        # Routing goes on in the background, so that a slow handler doesn't hold up the other events.
+        await self.routing_limit.acquire()
+        task = create_task(self.route(event, applied, trace))
+        self.routing_tasks.add(task)
+        task.add_done_callback(self.on_routed)
+        with suppress(Exception):
+            await shield(saved)  # the writer has already logged the error
+
+    def on_saved(self, event: Event, applied: Future, saved: Future):
+        """
+        Update the actual value once the event is committed, so that nobody sees a value which has never been saved.
+        Resolves `applied` with the previous value.
+        """
+        if saved.cancelled():
+            applied.cancel()
+            return
+        if saved.exception() is not None:
+            applied.set_exception(saved.exception())
+            return
+        previous = self.actual.get(event.channel)
+        if event.unit.is_stored:
+            self.actual[event.channel] = event
+            self.broadcaster.publish(event)  # binary values are never pushed
+        applied.set_result(previous)
+
+    def on_routed(self, task: Task):
+        self.routing_tasks.discard(task)
+        self.routing_limit.release()
+
+    async def route(self, event: Event, applied: Future, trace: Optional[Trace]):
+        """
+        Route the event once it is saved.
+        """
+        try:
+            try:
+                previous = await applied
+            except Exception:
+                return  # the writer has already logged the error
+            if trace is not None:
+                trace.mark('saved')
+            await router.on_event(
+                trace=trace,
+                event=event,
+                previous=previous,
+                actual=MappingProxyType(self.actual),
+                session=self.session,
+            )
+        finally:
+            if trace is not None:
+                self.tracer.finish(trace)
+
+    @property
+    def session(self) -> ClientSession:
+        """
+        Get the HTTP client session for user's automation needs.
+        """
+        return self.http.get_session()
+
+    async def read(self, callable_: Callable[..., T], *args: Any) -> T:
+        """
+        Run the callable with a database connection as the first argument.
+        Falls back to the writer thread when there's no reader pool, for example for an in-memory database.
+        """
+        start_time = perf_counter()
+        try:
+            if self.readers is not None:
+                return await self.readers.read(callable_, *args)
+            return await self.writer.execute(callable_, self.db, *args)
+        finally:
+            read_seconds.labels(callable_.__name__).observe(perf_counter() - start_time)
 
     async def close(self):
+        for task in list(self.routing_tasks):
+            task.cancel()
+        self.broadcaster.close()
+        self.tracer.close()
+        await self.writer.close()
+        if self.readers is not None:
+            self.readers.close()
         self.db.close()
-        await self.session.close()
+        await self.http.close()
@@ -1,16 +1,43 @@
 from __future__ import annotations
 
+from bisect import bisect_right
+from contextlib import closing, suppress
 from datetime import datetime, timedelta, timezone
-from typing import List, Mapping
+from heapq import merge
+from itertools import islice
+from math import inf
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
 from sqlitemap import Connection
 
-from my_iot.constants import ACTUAL_KEY
-from my_iot.types_ import Event
+from my_iot.chunks import Chunk, Columns, decode_columns, get_chunk_start, is_chunked, slice_columns
+from my_iot.compression import Compressor
+from my_iot.constants import ACTUAL_KEY, CHUNK_SEGMENT_SIZE, DATABASE_OPTIONS, MAX_CHART_POINTS, ROLLUP_RESOLUTIONS
+from my_iot.downsampling import MinMaxBuckets
+from my_iot.rollups import Rollup, aggregate, choose_resolution, get_bucket_start
+from my_iot.types_ import Event, Reading
+
+if TYPE_CHECKING:
+    from my_iot.retention import Retention  # the latter depends on this module
 
 EVENT_INCLUDE = {'timestamp', 'value'}  # logged value uses optimised representation
 
 
+def open_database(path: str) -> Connection:
+    """
+    Open the database and set it up.
+    """
+    db = Connection(path, **DATABASE_OPTIONS)
+    # Only takes effect on a new database, otherwise a manual `VACUUM` is needed.
+    db.connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    # Readers don't block the writer and vice versa. Commits don't wait for `fsync` in this mode.
+    with closing(db.connection.execute('PRAGMA journal_mode = WAL')) as cursor:
+        cursor.fetchall()
+    db.connection.execute('PRAGMA synchronous = NORMAL')
+    return db
+
+
 def timestamp_key(timestamp: datetime) -> str:
     """
     Get the key under which the timestamp is stored in a collection.
@@ -19,12 +46,246 @@ def timestamp_key(timestamp: datetime) -> str:
     return timestamp.astimezone(timezone.utc).strftime('%Y%m%d%H%M%S%f')
 
 
+def has_collection(db: Connection, name: str) -> bool:
+    """
+    Check whether the collection exists. Unlike `db[name]` doesn't create it.
+    """
+    if name in db.cache:
+        return True
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    with closing(db.connection.execute(query, [name])) as cursor:
+        return cursor.fetchone() is not None
+
+
+def get_keys(db: Connection, name: str, key: slice) -> List[str]:
+    """
+    Get the collection keys within the key slice, in order.
+    """
+    if not has_collection(db, name):
+        return []
+    collection = db[name]
+    query, parameters = collection.make_slice_query(key)
+    query = ['SELECT `key`', *query, 'ORDER BY `key`']
+    with closing(collection.connection.execute(' '.join(query), parameters)) as cursor:
+        return [key for key, in cursor]
+
+
+def get_last_item(db: Connection, name: str, key: slice) -> Optional[Tuple[str, Any]]:
+    """
+    Get the last key and value of the collection within the key slice.
+    """
+    if not has_collection(db, name):
+        return None
+    collection = db[name]
+    query, parameters = collection.make_slice_query(key)
+    query = ['SELECT `key`, `value`', *query, 'ORDER BY `key` DESC LIMIT 1']
+    with closing(collection.connection.execute(' '.join(query), parameters)) as cursor:
+        row = cursor.fetchone()
+    return (row[0], collection.loads(row[1])) if row is not None else None
+
+
+def iter_slice(db: Connection, name: str, key: slice) -> Iterator[Any]:
+    """
+    Iterate over the collection values within the key slice.
+    Unlike `collection[key]` doesn't keep all the values in memory.
+    A missing collection is treated as an empty one, so that reading works with a read-only connection.
+    """
+    if not has_collection(db, name):
+        return
+    collection = db[name]
+    query, parameters = collection.make_slice_query(key)
+    query = ['SELECT `value`', *query, 'ORDER BY `key`']
+    with closing(collection.connection.execute(' '.join(query), parameters)) as cursor:
+        for value, in cursor:
+            yield collection.loads(value)
+
+
 def save_event(db: Connection, event: Event) -> None:
+    save_events(db, [event])
+
+
+def save_events(db: Connection, events: Iterable[Event], compressor: Optional[Compressor] = None) -> None:
+    """
+    Save the events in a single transaction.
+    Float readings also update the rollups, which still account for the readings left out by the compressor.
+    """
+    # Every touched rollup is read and written only once per transaction.
+    touched: Dict[Tuple[str, str], Rollup] = {}
+    chunks = ChunkWriter(db)
+
+    def touch(name: str, key: str, from_raw: Callable[[Optional[Any]], Rollup]) -> Rollup:
+        item = touched.get((name, key))
+        if item is None:
+            item = touched[name, key] = from_raw(db[name].get(key))
+        return item
+
     with db:
-        if event.unit.is_stored:
-            db[ACTUAL_KEY][event.channel] = event.dict()
-        if event.unit.is_logged:
-            db[f'log:{event.channel}'][timestamp_key(event.timestamp)] = event.dict(include=EVENT_INCLUDE)
+        for event in events:
+            if event.unit.is_stored:
+                db[ACTUAL_KEY][event.channel] = event.dict()
+            if not event.unit.is_logged:
+                continue
+            if not is_chunked(event):
+                db[f'log:{event.channel}'][timestamp_key(event.timestamp)] = event.dict(include=EVENT_INCLUDE)
+                continue
+            timestamp, value = event.timestamp.timestamp(), float(event.value)
+            previous = chunks.insert(f'chunks:{event.channel}', timestamp, value)
+            if previous is None and compressor is not None:
+                # The reading may have been removed by the compressor, though the rollups still count it.
+                previous = compressor.pop_removed(event.channel, event.unit, timestamp)
+            if previous == value:
+                continue  # duplicate reading
+            for name, resolution in ROLLUP_RESOLUTIONS.items():
+                bucket_start = get_bucket_start(timestamp, resolution)
+                rollup = touch(
+                    f'rollup:{name}:{event.channel}',
+                    timestamp_key(bucket_start),
+                    lambda raw: Rollup.from_raw(raw) if raw is not None else Rollup(bucket_start.timestamp()),
+                )
+                if previous is None:
+                    rollup.add(value)
+                else:
+                    rollup.replace(previous, value)
+            if compressor is None:
+                continue
+            if previous is not None:
+                compressor.forget(event.channel, event.unit)  # the overwritten reading may have been relied upon
+                continue
+            redundant = compressor.add(event.channel, event.unit, timestamp, value)
+            if redundant is not None:
+                chunks.remove(f'chunks:{event.channel}', redundant)
+        chunks.flush()
+        for (name, key), item in touched.items():
+            db[name][key] = item.to_raw()
+
+
+class Tail:
+    """
+    State of the chunk which is written to by the current transaction.
+    """
+
+    __slots__ = ('key', 'last_timestamp', 'is_sealed')
+
+    def __init__(self, key: Optional[str], last_timestamp: float):
+        # Key of the segment which the new readings are appended to. `None` means that a new segment is needed.
+        self.key = key
+        self.last_timestamp = last_timestamp
+        self.is_sealed = False
+
+
+class ChunkWriter:
+    """
+    Writes the float readings within a single transaction.
+
+    The readings which are newer than the latest one of their chunk are appended to the small segment rows,
+    so that a transaction doesn't rewrite the entire chunk. A segment is keyed by the chunk key followed by the key
+    of its first reading, thus the segments are read in order along with the chunk itself.
+
+    The chunk is sealed, that is its segments are merged into the single row, once the next chunk gets its first
+    reading, or when an out-of-order reading is inserted into it.
+    """
+
+    def __init__(self, db: Connection, segment_size: int = CHUNK_SEGMENT_SIZE):
+        self.db = db
+        self.segment_size = segment_size
+        self.rows: Dict[Tuple[str, str], Chunk] = {}  # touched rows by the collection name and key
+        self.deleted: Set[Tuple[str, str]] = set()
+        self.tails: Dict[Tuple[str, str], Tail] = {}  # by the collection name and chunk key
+        self.unsealed: Set[Tuple[str, str]] = set()  # previous chunks which are still split into segments
+
+    def insert(self, name: str, timestamp: float, value: float) -> Optional[float]:
+        """
+        Insert the reading. Returns the replaced value, if any.
+        """
+        chunk_key = timestamp_key(get_chunk_start(timestamp))
+        tail = self.get_tail(name, chunk_key)
+        if not tail.is_sealed and timestamp <= tail.last_timestamp:
+            self.seal(name, chunk_key)
+            tail.is_sealed = True
+        if tail.is_sealed:
+            return self.rows[name, chunk_key].insert(timestamp, value)
+        if tail.key is None:
+            tail.key = f'{chunk_key}{timestamp_key(datetime.fromtimestamp(timestamp, timezone.utc))}'
+        tail.last_timestamp = timestamp
+        return self.touch(name, tail.key).insert(timestamp, value)
+
+    def remove(self, name: str, timestamp: float):
+        """
+        Remove the reading, if any.
+        """
+        chunk_key = timestamp_key(get_chunk_start(timestamp))
+        tail = self.get_tail(name, chunk_key)
+        if tail.is_sealed:
+            self.rows[name, chunk_key].remove(timestamp)
+            return
+        # The compressor removes the latest readings, so look up the tail segment first.
+        if tail.key is not None:
+            segment = self.touch(name, tail.key)
+            if segment and segment.timestamps[0] <= timestamp:
+                segment.remove(timestamp)
+                return
+        keys = get_keys(self.db, name, slice(chunk_key, None, f'{chunk_key}%'))
+        index = bisect_right(keys, f'{chunk_key}{timestamp_key(datetime.fromtimestamp(timestamp, timezone.utc))}')
+        if index:
+            self.touch(name, keys[index - 1]).remove(timestamp)
+
+    def get_tail(self, name: str, chunk_key: str) -> Tail:
+        tail = self.tails.get((name, chunk_key))
+        if tail is not None:
+            return tail
+        item = get_last_item(self.db, name, slice(chunk_key, None, f'{chunk_key}%'))
+        if item is None:
+            # The first reading of the chunk, so the previous chunk won't likely get new readings.
+            previous = get_last_item(self.db, name, slice(None, chunk_key))
+            if previous is not None and len(previous[0]) > len(chunk_key):
+                self.unsealed.add((name, previous[0][:len(chunk_key)]))
+            tail = Tail(None, -inf)
+        else:
+            key, raw = item
+            timestamps, _ = decode_columns(raw)
+            last_timestamp = timestamps[-1] if timestamps else -inf
+            if key != chunk_key and len(timestamps) < self.segment_size:
+                self.rows.setdefault((name, key), Chunk.from_raw(raw))
+                tail = Tail(key, last_timestamp)
+            else:
+                tail = Tail(None, last_timestamp)
+        self.tails[name, chunk_key] = tail
+        return tail
+
+    def seal(self, name: str, chunk_key: str):
+        """
+        Merge the chunk segments into the chunk row.
+        """
+        keys = set(get_keys(self.db, name, slice(chunk_key, None, f'{chunk_key}%')))
+        keys.update(key for row_name, key in self.rows if row_name == name and key.startswith(chunk_key))
+        chunk = self.touch(name, chunk_key)
+        for key in sorted(keys):
+            if key == chunk_key or (name, key) in self.deleted:
+                continue
+            # The readings are appended to a segment only if they're newer than the chunk ones.
+            segment = self.rows.pop((name, key), None)
+            if segment is None:
+                segment = Chunk.from_raw(self.db[name][key])
+            chunk.timestamps.extend(segment.timestamps)
+            chunk.values.extend(segment.values)
+            self.deleted.add((name, key))
+
+    def touch(self, name: str, key: str) -> Chunk:
+        chunk = self.rows.get((name, key))
+        if chunk is None:
+            chunk = self.rows[name, key] = Chunk.from_raw(self.db[name].get(key))
+        return chunk
+
+    def flush(self):
+        for name, chunk_key in self.unsealed:
+            tail = self.tails.get((name, chunk_key))
+            if tail is None or not tail.is_sealed:
+                self.seal(name, chunk_key)
+        for name, key in self.deleted:
+            with suppress(KeyError):
+                del self.db[name][key]  # the segment may have been started within the transaction
+        for (name, key), chunk in self.rows.items():
+            self.db[name][key] = chunk.to_raw()
 
 
 def get_actual(db: Connection) -> Mapping[str, Event]:
@@ -34,11 +295,205 @@ def get_actual(db: Connection) -> Mapping[str, Event]:
     return {key: Event(**value) for key, value in db[ACTUAL_KEY].items()}
 
 
-def get_log(db: Connection, channel: str, period: timedelta) -> List[Event]:
+def iter_columns(db: Connection, channel: str, since: datetime, until: Optional[datetime] = None) -> Iterator[Columns]:
+    """
+    Iterate over the chunk columns of the channel within `since <= timestamp < until`.
+    """
+    key = slice(
+        timestamp_key(get_chunk_start(since.timestamp())),
+        timestamp_key(until) if until is not None else None,
+    )
+    for raw in iter_slice(db, f'chunks:{channel}', key):
+        timestamps, values = decode_columns(raw)
+        if not timestamps:
+            continue
+        # Only the boundary chunks need to be sliced.
+        if timestamps[0] < since.timestamp() or (until is not None and timestamps[-1] >= until.timestamp()):
+            timestamps, values = slice_columns(
+                (timestamps, values),
+                since.timestamp(),
+                until.timestamp() if until is not None else None,
+            )
+            if not timestamps:
+                continue
+        yield timestamps, values
+
+
+def get_log(db: Connection, channel: str, period: timedelta) -> List[Reading]:
     """
     Gets the channel log within the specified period until now.
     """
-    return [
-        Event(**event)
-        for event in db[f'log:{channel}'][timestamp_key(datetime.now() - period):]
-    ]
+    return list(iter_log(db, channel, datetime.now(timezone.utc) - period))
+
+
+def iter_log(db: Connection, channel: str, since: datetime, until: Optional[datetime] = None) -> Iterator[Reading]:
+    """
+    Iterate over the channel log within `since <= timestamp < until`.
+    Both the chunks and the plain log collection are read, the latter may still contain older readings.
+    """
+    chunked = (
+        Reading(timestamp, value)
+        for timestamps, values in iter_columns(db, channel, since, until)
+        for timestamp, value in zip(timestamps, values)
+    )
+    key = slice(timestamp_key(since), timestamp_key(until) if until is not None else None)
+    logged = (Reading(item['timestamp'].timestamp(), item['value']) for item in iter_slice(db, f'log:{channel}', key))
+    return merge(logged, chunked, key=attrgetter('timestamp'))
+
+
+def get_log_page(db: Connection, channel: str, since: datetime, until: datetime, limit: int) -> List[Reading]:
+    """
+    Get at most `limit` first readings of the channel within `since <= timestamp < until`.
+    """
+    return list(islice(iter_log(db, channel, since, until), limit))
+
+
+def iter_float_columns(
+    db: Connection,
+    channel: str,
+    since: datetime,
+    until: Optional[datetime] = None,
+) -> Iterator[Columns]:
+    """
+    Iterate over the float readings of the channel within `since <= timestamp < until`.
+    Numeric plain log rows are yielded as single-point columns.
+    """
+    key = slice(timestamp_key(since), timestamp_key(until) if until is not None else None)
+    logged = (
+        ((event['timestamp'].timestamp(),), (event['value'],))
+        for event in iter_slice(db, f'log:{channel}', key)
+        if isinstance(event['value'], (int, float))
+    )
+    # Plain log rows normally come from before the chunks were introduced, so there's no need to merge point by point.
+    return merge(logged, iter_columns(db, channel, since, until), key=get_first_timestamp)
+
+
+def get_first_timestamp(columns: Columns) -> float:
+    return columns[0][0]
+
+
+def iter_rollups(
+    db: Connection,
+    channel: str,
+    resolution: str,
+    since: datetime,
+    until: Optional[datetime] = None,
+) -> Iterator[Rollup]:
+    """
+    Iterate over the channel rollups of the specified resolution which start before `until`.
+    The first rollup may start before `since`.
+    """
+    key = slice(
+        timestamp_key(get_bucket_start(since.timestamp(), ROLLUP_RESOLUTIONS[resolution])),
+        timestamp_key(until) if until is not None else None,
+    )
+    for raw in iter_slice(db, f'rollup:{resolution}:{channel}', key):
+        yield Rollup.from_raw(raw)
+
+
+def get_downsampled_log(
+    db: Connection,
+    channel: str,
+    period: timedelta,
+    max_points: int = MAX_CHART_POINTS,
+    until: Optional[datetime] = None,
+    retention: Optional[Retention] = None,
+) -> Tuple[List[float], List[float]]:
+    """
+    Gets at most `max_points` timestamps and values of the float channel within the specified period until `until`,
+    which is now by default.
+    Streams the log in a single pass and keeps the minimum and the maximum of every time bucket.
+    Uses the coarsest rollups which still fill all the buckets and are kept according to the retention policy.
+    """
+    now = datetime.now(timezone.utc)
+    if until is None:
+        until = now
+    since = until - period
+    buckets = MinMaxBuckets(since.timestamp(), until.timestamp(), max_points)
+
+    resolution = choose_resolution(period, buckets.n_buckets, retention, now - since)
+    if resolution is not None:
+        for rollup in iter_rollups(db, channel, resolution, since, until):
+            buckets.add(rollup.timestamp, rollup.min)
+            buckets.add(rollup.timestamp, rollup.max)
+    else:
+        for timestamps, values in iter_float_columns(db, channel, since, until):
+            buckets.add_columns(timestamps, values)
+
+    return buckets.finish()
+
+
+def get_stats(
+    db: Connection,
+    channel: str,
+    period: timedelta,
+    retention: Optional[Retention] = None,
+) -> Optional[Rollup]:
+    """
+    Gets count, minimum, maximum and sum of the float channel within the specified period until now.
+    Uses the same rollups as the chart does.
+    """
+    since = datetime.now(timezone.utc) - period
+    stats = Rollup(since.timestamp())
+    resolution = choose_resolution(period, MAX_CHART_POINTS // 2, retention)
+    if resolution is not None:
+        for rollup in iter_rollups(db, channel, resolution, since):
+            stats.merge(rollup)
+    else:
+        for _, values in iter_float_columns(db, channel, since):
+            stats.add_values(values)
+    return stats if stats.count else None
+
+
+def rebuild_rollups(db: Connection) -> int:
+    """
+    Rebuild rollups of all the float channels from their logs.
+    Returns the number of processed channels.
+    """
+    since = datetime.fromtimestamp(0.0, timezone.utc)
+    n_channels = 0
+    for channel, event in get_actual(db).items():
+        if not event.unit.is_float:
+            continue
+        n_channels += 1
+        with db:
+            for name, resolution in ROLLUP_RESOLUTIONS.items():
+                with suppress(KeyError):
+                    del db[f'rollup:{name}:{channel}']
+                collection = db[f'rollup:{name}:{channel}']
+                for rollup in aggregate(iter_float_columns(db, channel, since), resolution):
+                    collection[timestamp_key(datetime.fromtimestamp(rollup.timestamp, timezone.utc))] = rollup.to_raw()
+    return n_channels
+
+
+def delete_expired(db: Connection, name: str, expiry: datetime, limit: int) -> int:
+    """
+    Delete at most `limit` oldest items of the collection which are keyed before the expiry time.
+    Returns the number of deleted items.
+    """
+    with db, closing(db.connection.execute(f'''
+        DELETE FROM "{name}" WHERE `key` IN (
+            SELECT `key` FROM "{name}" WHERE `key` < ? ORDER BY `key` LIMIT ?
+        )
+    ''', [timestamp_key(expiry), limit])) as cursor:
+        return cursor.rowcount
+
+
+def get_size(db: Connection) -> int:
+    """
+    Get the database file size in bytes.
+    """
+    with closing(db.connection.execute('PRAGMA page_count')) as cursor:
+        page_count, = cursor.fetchone()
+    with closing(db.connection.execute('PRAGMA page_size')) as cursor:
+        page_size, = cursor.fetchone()
+    return page_count * page_size
+
+
+def vacuum(db: Connection, n_pages: int) -> None:
+    """
+    Return at most `n_pages` free pages to the file system.
+    Does nothing if the incremental vacuum is disabled for the database.
+    """
+    with closing(db.connection.execute(f'PRAGMA incremental_vacuum({int(n_pages)})')) as cursor:
+        cursor.fetchall()  # every step frees a single page
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+
+class MinMaxBuckets:
+    """
+    Downsamples a time series in a single pass.
+    Splits the time range into equal buckets and keeps only the minimum and the maximum point of every bucket.
+    Unlike taking every n-th point, this keeps the peaks. If only a single point is requested, that's the maximum.
+
+    Points must be added in ascending order of their timestamps.
+    """
+
+    def __init__(self, since: float, until: float, max_points: int):
+        self.since = since
+        self.n_buckets = max(max_points // 2, 1)
+        self.keep_min = max_points > 1
+        self.bucket_size = max(until - since, 1e-6) / self.n_buckets
+
+        self.timestamps: List[float] = []
+        self.values: List[float] = []
+
+        # Current bucket index and its extremes as `(timestamp, value)`.
+        self.bucket: Optional[int] = None
+        self.min: Tuple[float, float] = (0.0, 0.0)
+        self.max: Tuple[float, float] = (0.0, 0.0)
+
+    def get_bucket(self, timestamp: float) -> int:
+        return max(min(int((timestamp - self.since) // self.bucket_size), self.n_buckets - 1), 0)
+
+    def add(self, timestamp: float, value: float):
+        """
+        Add the single point.
+        """
+        bucket = self.get_bucket(timestamp)
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket, self.min, self.max = bucket, (timestamp, value), (timestamp, value)
+        elif value < self.min[1]:
+            self.min = (timestamp, value)
+        elif value > self.max[1]:
+            self.max = (timestamp, value)
+
+    def add_columns(self, timestamps: Sequence[float], values: Sequence[float]):
+        """
+        Add the columns. Works bucket by bucket rather than point by point.
+        """
+        start = 0
+        while start < len(timestamps):
+            bucket = self.get_bucket(timestamps[start])
+            stop = bisect_left(timestamps, self.since + (bucket + 1) * self.bucket_size, start)
+            if bucket == self.n_buckets - 1:
+                stop = len(timestamps)
+            stop = max(stop, start + 1)
+            segment = list(values[start:stop])
+            min_value, max_value = min(segment), max(segment)
+            min_index, max_index = segment.index(min_value), segment.index(max_value)
+            # Feed the extremes in the original order so that the bucket state stays consistent.
+            for index in sorted((min_index, max_index)):
+                self.add(timestamps[start + index], segment[index])
+            start = stop
+
+    def flush(self):
+        if self.bucket is None:
+            return
+        for timestamp, value in sorted({self.min, self.max} if self.keep_min else {self.max}):
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+        self.bucket = None
+
+    def finish(self) -> Tuple[List[float], List[float]]:
+        """
+        Get the downsampled timestamps and values.
+        """
+        self.flush()
+        return self.timestamps, self.values
@@ -1,11 +1,57 @@
 from __future__ import annotations
 
-from asyncio import get_running_loop
+from asyncio import get_running_loop, sleep
+from concurrent.futures import Executor
 from functools import partial
-from typing import Any, Callable, TypeVar
+from time import monotonic
+from typing import Any, Callable, Optional, TypeVar
 
 T = TypeVar('T')
 
 
-async def run_in_executor(callable_: Callable[..., T], *args: Any, **kwargs: Any) -> T:
-    return await get_running_loop().run_in_executor(None, partial(callable_, *args, **kwargs))
+async def run_in_executor(
+    callable_: Callable[..., T],
+    *args: Any,
+    executor: Optional[Executor] = None,
+    **kwargs: Any,
+) -> T:
+    return await get_running_loop().run_in_executor(executor, partial(callable_, *args, **kwargs))
+
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average and bursts of up to `capacity` operations.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = monotonic()
+
+    def get_delay(self) -> float:
+        """
+        Get the time in seconds until a token is available.
+        """
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return max(1.0 - self.tokens, 0.0) / self.rate
+
+    async def acquire(self):
+        """
+        Wait for a token and take it.
+        """
+        while True:
+            delay = self.get_delay()
+            if not delay:
+                break
+            await sleep(delay)
+        self.tokens -= 1.0
+
+    def pause(self, seconds: float):
+        """
+        Make the next token available not earlier than in the specified time.
+        """
+        self.get_delay()
+        self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Any, DefaultDict, Dict, Optional
+
+from aiohttp import (
+    ClientSession,
+    TCPConnector,
+    TraceConfig,
+    TraceRequestEndParams,
+    TraceRequestExceptionParams,
+    TraceRequestStartParams,
+)
+from loguru import logger
+
+from my_iot.constants import HTTP_CONNECTION_LIMIT, HTTP_CONNECTION_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_TIMEOUT
+
+
+@dataclass
+class HostStats:
+    """
+    Requests to a single host.
+    """
+
+    n_requests: int = 0
+    n_errors: int = 0
+
+    # Requests which are being sent or waiting for a response right now.
+    n_active: int = 0
+
+    # Total time from the request start till the response headers, in seconds.
+    latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.latency / self.n_requests if self.n_requests else 0.0
+
+
+class HttpClients:
+    """
+    Sessions for the services and the automation which share a single pool of keep-alive connections.
+    Collects per-host request statistics.
+    """
+
+    def __init__(
+        self,
+        limit: int = HTTP_CONNECTION_LIMIT,
+        limit_per_host: int = HTTP_CONNECTION_LIMIT_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.connector: Optional[TCPConnector] = None
+        self.sessions: Dict[str, ClientSession] = {}
+        self.stats: DefaultDict[str, HostStats] = defaultdict(HostStats)
+
+        # Requests which are waiting for a free connection right now.
+        self.n_queued = 0
+
+        self.trace_config = TraceConfig()
+        self.trace_config.on_request_start.append(self.on_request_start)
+        self.trace_config.on_request_end.append(self.on_request_end)
+        self.trace_config.on_request_exception.append(self.on_request_exception)
+        self.trace_config.on_connection_queued_start.append(self.on_connection_queued_start)
+        self.trace_config.on_connection_queued_end.append(self.on_connection_queued_end)
+
+    def get_session(self, name: str = 'default', **kwargs: Any) -> ClientSession:
+        """
+        Get the named session. It's created with the keyword arguments on the first call.
+        Must be called from a coroutine.
+        """
+        session = self.sessions.get(name)
+        if session is None:
+            if self.connector is None:
+                self.connector = TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                )
+            kwargs.setdefault('timeout', HTTP_TIMEOUT)
+            session = self.sessions[name] = ClientSession(
+                connector=self.connector,
+                connector_owner=False,
+                trace_configs=[self.trace_config],
+                **kwargs,
+            )
+        return session
+
+    @property
+    def n_active(self) -> int:
+        """
+        Get the number of requests which are waiting for a response.
+        """
+        return sum(stats.n_active for stats in self.stats.values())
+
+    async def on_request_start(self, _: ClientSession, context: SimpleNamespace, params: TraceRequestStartParams):
+        context.start_time = perf_counter()
+        self.stats[params.url.host].n_active += 1
+
+    async def on_request_end(self, _: ClientSession, context: SimpleNamespace, params: TraceRequestEndParams):
+        stats = self.stats[params.url.host]
+        stats.n_active -= 1
+        stats.n_requests += 1
+        stats.latency += perf_counter() - context.start_time
+
+    async def on_request_exception(self, _: ClientSession, __: SimpleNamespace, params: TraceRequestExceptionParams):
+        stats = self.stats[params.url.host]
+        stats.n_active -= 1
+        stats.n_errors += 1
+
+    async def on_connection_queued_start(self, *_: Any):
+        self.n_queued += 1
+
+    async def on_connection_queued_end(self, *_: Any):
+        self.n_queued -= 1
+
+    async def close(self):
+        for name, session in self.sessions.items():
+            logger.debug('Closing the `{}` HTTP session…', name)
+            await session.close()
+        self.sessions.clear()
+        if self.connector is not None:
+            await self.connector.close()
+            self.connector = None
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import struct
+from asyncio import Event as Signal
+from asyncio import get_running_loop
+from collections import defaultdict
+from pathlib import Path
+from typing import DefaultDict, Dict, Optional, Set
+
+from loguru import logger
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+
+# Any of these means that the file may have a new value.
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_HEADER = struct.Struct('iIII')  # `wd`, `mask`, `cookie` and `len`
+
+# Pseudo-file systems never send notifications.
+UNWATCHABLE_PATHS = (Path('/proc'), Path('/sys'))
+
+
+def load_libc() -> Optional[ctypes.CDLL]:
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+    libc = ctypes.CDLL(name, use_errno=True)
+    return libc if hasattr(libc, 'inotify_init1') else None
+
+
+class Subscription:
+    """
+    Tells that the file has probably changed.
+    """
+
+    def __init__(self, watcher: Watcher, path: Path):
+        self.watcher = watcher
+        self.path = path
+        self.signal = Signal()
+
+    async def wait(self):
+        await self.signal.wait()
+        self.signal.clear()
+
+    def close(self):
+        self.watcher.unsubscribe(self)
+
+
+class Watcher:
+    """
+    Minimal `inotify` binding on top of `ctypes`, so that no extra dependency is needed.
+
+    Watches directories rather than single files, so that every directory has a single watch
+    which is shared by all the subscriptions to its files. The watch also survives the file being replaced.
+    """
+
+    def __init__(self):
+        self.libc = load_libc() if os.name == 'posix' else None
+        self.fd: Optional[int] = None
+        self.directories: Dict[Path, int] = {}
+        self.subscriptions: DefaultDict[int, Dict[str, Set[Subscription]]] = defaultdict(lambda: defaultdict(set))
+
+    def subscribe(self, path: Path) -> Optional[Subscription]:
+        """
+        Subscribe to the file changes. Returns `None` if the file can't be watched, so that it needs to be polled.
+        """
+        if self.libc is None:
+            return None
+        path = path.resolve()
+        if any(parent in UNWATCHABLE_PATHS for parent in path.parents):
+            return None
+        if self.fd is None:
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                logger.warning('Failed to initialize inotify: {}.', os.strerror(ctypes.get_errno()))
+                return None
+            self.fd = fd
+            get_running_loop().add_reader(fd, self.on_readable)
+        directory = path.parent
+        wd = self.directories.get(directory)
+        if wd is None:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                logger.warning('Failed to watch {}: {}.', directory, os.strerror(ctypes.get_errno()))
+                return None
+            self.directories[directory] = wd
+        subscription = Subscription(self, path)
+        self.subscriptions[wd][path.name].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        directory = subscription.path.parent
+        wd = self.directories.get(directory)
+        if wd is None:
+            return
+        names = self.subscriptions[wd]
+        names[subscription.path.name].discard(subscription)
+        if not names[subscription.path.name]:
+            del names[subscription.path.name]
+        if not names:
+            del self.subscriptions[wd]
+            del self.directories[directory]
+            self.libc.inotify_rm_watch(self.fd, wd)
+        if not self.directories:
+            self.close()
+
+    def on_readable(self):
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_IGNORED:
+                continue
+            for subscription in self.subscriptions.get(wd, {}).get(name, ()):
+                subscription.signal.set()
+
+    def close(self):
+        if self.fd is not None:
+            get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+
+# Watcher singleton shared by all the services.
+watcher = Watcher()
@@ -21,6 +21,19 @@ class InterceptHandler(logging.Handler):
 
 def init_logging(verbosity: int):
     logger.stop()
-    logger.add(sys.stderr, format=LOGURU_FORMAT, level=VERBOSITY_LEVELS.get(verbosity, 'TRACE'), backtrace=False)
+    logger.add(
+        sys.stderr,
+        format=LOGURU_FORMAT,
+        level=VERBOSITY_LEVELS.get(verbosity, 'TRACE'),
+        backtrace=False,
+        filter=is_not_trace,
+    )
     logging.basicConfig(level=logging.NOTSET, handlers=[InterceptHandler()])
     logger.disable('aiosqlite.core')
+
+
+def is_not_trace(record: dict) -> bool:
+    """
+    Slow event traces only go to their own file.
+    """
+    return 'trace_path' not in record['extra']
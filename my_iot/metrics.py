@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, Generic, Iterator, List, Sequence, Tuple, Type, TypeVar
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Value:
+    """
+    Single counter or gauge value.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+    def iter_samples(self, name: str, labels: str) -> Iterator[str]:
+        yield f'{name}{labels} {self.value!r}\n'
+
+
+class Histogram:
+    """
+    Single histogram. The bucket counters are allocated once.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is `+Inf`
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def iter_samples(self, name: str, labels: str) -> Iterator[str]:
+        prefix = f'{labels[:-1]},' if labels else '{'
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{prefix}le="{bound}"}} {cumulative}\n'
+        yield f'{name}_sum{labels} {self.sum!r}\n'
+        yield f'{name}_count{labels} {self.count}\n'
+
+
+T = TypeVar('T', Value, Histogram)
+
+
+class Metric(Generic[T]):
+    """
+    Family of the values with the same name and different labels.
+    Callers on the hot paths are supposed to keep the labelled values rather than look them up every time.
+    """
+
+    def __init__(self, type_: str, value_class: Type[T], name: str, help_: str, label_names: Sequence[str] = ()):
+        self.type = type_
+        self.value_class = value_class
+        self.name = name
+        self.help = help_
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple[str, ...], T] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *label_values: str) -> T:
+        """
+        Get the value with the labels, creating it on the first call.
+        """
+        value = self.values.get(label_values)
+        if value is None:
+            assert len(label_values) == len(self.label_names), 'label count mismatch'
+            value = self.values[label_values] = self.value_class()
+        return value
+
+    def iter_lines(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.help}\n'
+        yield f'# TYPE {self.name} {self.type}\n'
+        for label_values, value in self.values.items():
+            yield from value.iter_samples(self.name, format_labels(self.label_names, label_values))
+
+
+def counter(name: str, help_: str, label_names: Sequence[str] = ()) -> Metric[Value]:
+    return Metric('counter', Value, name, help_, label_names)
+
+
+def gauge(name: str, help_: str, label_names: Sequence[str] = ()) -> Metric[Value]:
+    return Metric('gauge', Value, name, help_, label_names)
+
+
+def histogram(name: str, help_: str, label_names: Sequence[str] = ()) -> Metric[Histogram]:
+    return Metric('histogram', Histogram, name, help_, label_names)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render() -> str:
+    """
+    Render all the metrics in the Prometheus text format.
+    """
+    return ''.join(line for metric in REGISTRY for line in metric.iter_lines())
+
+
+REGISTRY: List[Metric] = []
+
+events_total = counter('my_iot_events_total', 'Events received from the services.', ['service', 'channel'])
+service_restarts_total = counter('my_iot_service_restarts_total', 'Service restarts after a failure.', ['service'])
+service_errors = gauge('my_iot_service_errors', 'Consecutive errors of the service.', ['service'])
+service_backoff_seconds = gauge('my_iot_service_backoff_seconds', 'Current service restart delay.', ['service'])
+queue_depth = gauge('my_iot_queue_depth', 'Events waiting in the ingestion queue.')
+write_seconds = histogram('my_iot_write_seconds', 'Time to save a batch of events.')
+write_depth = gauge('my_iot_write_depth', 'Events waiting to be saved.')
+read_seconds = histogram('my_iot_read_seconds', 'Time to read the database.', ['function'])
+routing_tasks = gauge('my_iot_routing_tasks', 'Events being saved or routed.')
+handlers_running = gauge('my_iot_handlers_running', 'Event handlers which haven\'t finished yet.')
+handler_seconds = histogram('my_iot_handler_seconds', 'Event handler time.', ['handler'])
+handler_errors_total = counter('my_iot_handler_errors_total', 'Event handler failures.', ['handler'])
+http_request_seconds = histogram('my_iot_http_request_seconds', 'Web request time.', ['route'])
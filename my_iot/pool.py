@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock, local
+from typing import Any, Callable, List, TypeVar
+
+from sqlitemap import Connection
+
+from my_iot.constants import DATABASE_OPTIONS
+from my_iot.helpers import run_in_executor
+
+T = TypeVar('T')
+
+
+class ReaderPool:
+    """
+    Pool of connections used for reading only.
+    Every thread of the pool has its own connection, so that in the WAL mode
+    the reads run in parallel with each other and with the writer thread.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='reader')
+        self.local = local()
+        self.connections: List[Connection] = []
+        self.lock = Lock()
+
+    def get_connection(self) -> Connection:
+        """
+        Get the connection of the current thread.
+        """
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            # Read-only, so that a reader never takes the write lock, which the writer may hold for a while.
+            uri = f'{Path(self.path).absolute().as_uri()}?mode=ro'
+            db = self.local.db = Connection(uri, uri=True, **DATABASE_OPTIONS)
+            with self.lock:
+                self.connections.append(db)
+        return db
+
+    def call(self, callable_: Callable[..., T], *args: Any) -> T:
+        return callable_(self.get_connection(), *args)
+
+    async def read(self, callable_: Callable[..., T], *args: Any) -> T:
+        """
+        Run the callable with a pooled connection as the first argument.
+        """
+        return await run_in_executor(self.call, callable_, *args, executor=self.executor)
+
+    def close(self):
+        self.executor.shutdown()
+        with self.lock:
+            for db in self.connections:
+                db.close()
+            self.connections.clear()
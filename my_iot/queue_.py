@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from asyncio import CancelledError, Future, get_running_loop
+from collections import OrderedDict, defaultdict, deque
+from contextlib import suppress
+from dataclasses import dataclass, field
+from enum import Enum
+from itertools import count
+from time import monotonic, perf_counter
+from typing import DefaultDict, Deque, Dict
+
+from my_iot.types_ import Event
+
+
+class Overflow(str, Enum):
+    """
+    Tells what happens to an event which is put into the full queue.
+    """
+
+    BLOCK = 'BLOCK'  # wait until there's room
+    DROP = 'DROP'  # discard the event
+    COALESCE = 'COALESCE'  # replace the latest queued event of the same channel, otherwise wait
+
+
+@dataclass
+class SourceStats:
+    """
+    Statistics of the events put by a single source.
+    """
+
+    n_events: int = 0
+    n_dropped: int = 0
+    n_coalesced: int = 0
+
+    # Total time spent waiting for room in the queue, in seconds.
+    wait_time: float = 0.0
+
+    started_at: float = field(default_factory=monotonic)
+
+    @property
+    def rate(self) -> float:
+        """
+        Get the number of events per second.
+        """
+        return self.n_events / max(monotonic() - self.started_at, 1e-6)
+
+    @property
+    def mean_wait_time(self) -> float:
+        return self.wait_time / self.n_events if self.n_events else 0.0
+
+
+class EventQueue:
+    """
+    Bounded FIFO queue between the services and the event pipeline.
+    A full queue applies the overflow policy, so that a bursty service can't flood the process.
+    """
+
+    def __init__(self, max_size: int, overflow: Overflow = Overflow.BLOCK):
+        self.max_size = max_size
+        self.overflow = overflow
+
+        # Queued events keyed by their sequence numbers.
+        self.pending: OrderedDict[int, Event] = OrderedDict()
+        self.sequence = count()
+
+        # Sequence number of the latest queued event of every channel, so that the full queue can coalesce them.
+        self.latest: Dict[str, int] = {}
+
+        # Futures of the blocked `get` and `put` calls.
+        self.getters: Deque[Future] = deque()
+        self.putters: Deque[Future] = deque()
+
+        self.stats: DefaultDict[str, SourceStats] = defaultdict(SourceStats)
+
+    @property
+    def depth(self) -> int:
+        """
+        Get the number of queued events.
+        """
+        return len(self.pending)
+
+    async def put(self, event: Event, source: str) -> bool:
+        """
+        Put the event according to the overflow policy.
+        Returns `False` if the event is dropped.
+        """
+        stats = self.stats[source]
+        start_time = perf_counter()
+        while True:
+            if len(self.pending) < self.max_size:
+                key = self.latest[event.channel] = next(self.sequence)
+                self.pending[key] = event
+                wake_up(self.getters)
+                break
+            if self.overflow == Overflow.COALESCE and event.channel in self.latest:
+                self.pending[self.latest[event.channel]] = event  # the queued event keeps its place
+                stats.n_coalesced += 1
+                break
+            if self.overflow == Overflow.DROP:
+                stats.n_dropped += 1
+                return False
+            await wait(self.putters)
+        stats.n_events += 1
+        stats.wait_time += perf_counter() - start_time
+        return True
+
+    async def get(self) -> Event:
+        """
+        Get the oldest event, waiting for one if the queue is empty.
+        """
+        while not self.pending:
+            await wait(self.getters)
+        key, event = self.pending.popitem(last=False)
+        if self.latest.get(event.channel) == key:
+            del self.latest[event.channel]
+        wake_up(self.putters)
+        return event
+
+
+async def wait(waiters: Deque[Future]):
+    """
+    Wait until `wake_up` is called for the waiters.
+    """
+    future = get_running_loop().create_future()
+    waiters.append(future)
+    try:
+        await future
+    except CancelledError:
+        with suppress(ValueError):
+            waiters.remove(future)
+        if future.done() and not future.cancelled():
+            wake_up(waiters)  # pass the wake-up on to the next waiter
+        raise
+
+
+def wake_up(waiters: Deque[Future]):
+    """
+    Wake up the longest waiting one.
+    """
+    while waiters:
+        future = waiters.popleft()
+        if not future.done():
+            future.set_result(None)
+            break
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Mapping, Optional, Pattern, Tuple
+
+from loguru import logger
+
+from my_iot.constants import CHUNK_DURATION, COMPACTION_BATCH_SIZE, ROLLUP_RESOLUTIONS, VACUUM_BATCH_SIZE
+from my_iot.database import delete_expired, get_size, vacuum
+from my_iot.types_ import Event, Unit
+from my_iot.writer import EventWriter
+
+
+@dataclass
+class Retention:
+    """
+    Tells how long the logs of the matching channels are kept.
+    Everything is kept forever by default.
+    """
+
+    # Regular expression which the channel must fully match.
+    channel: str = '.*'
+
+    # Unit which the channel must have. Any unit matches by default.
+    unit: Optional[Unit] = None
+
+    # How long the raw readings are kept.
+    raw: Optional[timedelta] = None
+
+    # How long the rollups are kept, by resolution name. For example: `{'minute': timedelta(days=7)}`.
+    rollups: Dict[str, timedelta] = field(default_factory=dict)
+
+    channel_regex: Pattern = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.channel_regex = re.compile(self.channel)
+
+    def matches(self, channel: str, unit: Optional[Unit]) -> bool:
+        return (self.unit is None or self.unit == unit) and bool(self.channel_regex.fullmatch(channel))
+
+
+def find_retention(retention: Iterable[Retention], channel: str, unit: Optional[Unit]) -> Optional[Retention]:
+    """
+    Find the first retention policy that matches the channel.
+    """
+    for policy in retention:
+        if policy.matches(channel, unit):
+            return policy
+    return None
+
+
+def get_expiry(policy: Retention, name: str, now: datetime) -> Optional[datetime]:
+    """
+    Get time before which the items of the collection are expired, if any.
+    Items are keyed by their start time, so an item expires only when it ends before the cutoff.
+    """
+    kind, _, rest = name.partition(':')
+    if kind == 'log' and policy.raw is not None:
+        return now - policy.raw
+    if kind == 'chunks' and policy.raw is not None:
+        return now - policy.raw - CHUNK_DURATION
+    if kind == 'rollup':
+        resolution = rest.partition(':')[0]
+        if resolution in policy.rollups:
+            return now - policy.rollups[resolution] - ROLLUP_RESOLUTIONS[resolution]
+    return None
+
+
+def get_channel(name: str) -> Optional[str]:
+    """
+    Get channel of the log, chunks or rollup collection.
+    """
+    kind, _, rest = name.partition(':')
+    if kind in ('log', 'chunks'):
+        return rest
+    if kind == 'rollup':
+        return rest.partition(':')[2]
+    return None
+
+
+async def compact(
+    writer: EventWriter,
+    retention: Iterable[Retention],
+    actual: Mapping[str, Event],
+) -> Tuple[int, int]:
+    """
+    Delete the expired log items and return the freed pages to the file system.
+    Works in small batches in between the event writes.
+    Returns the number of deleted items and the number of reclaimed bytes.
+    """
+    db = writer.db
+    now = datetime.now(timezone.utc)
+    initial_size = await writer.execute(get_size, db)
+
+    n_deleted = 0
+    for name in await writer.execute(list, db):
+        channel = get_channel(name)
+        if channel is None:
+            continue
+        event = actual.get(channel)
+        policy = find_retention(retention, channel, event.unit if event is not None else None)
+        if policy is None:
+            continue
+        expiry = get_expiry(policy, name, now)
+        if expiry is None:
+            continue
+        while True:
+            n_batch = await writer.execute(delete_expired, db, name, expiry, COMPACTION_BATCH_SIZE)
+            n_deleted += n_batch
+            if n_batch < COMPACTION_BATCH_SIZE:
+                break
+        logger.debug('Compacted `{}`.', name)
+
+    size = initial_size
+    while True:
+        await writer.execute(vacuum, db, VACUUM_BATCH_SIZE)
+        size, previous_size = await writer.execute(get_size, db), size
+        if size >= previous_size:
+            break
+
+    return n_deleted, initial_size - size
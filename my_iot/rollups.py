@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from math import inf
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional, Sequence, Tuple
+
+from my_iot.constants import ROLLUP_RESOLUTIONS
+
+if TYPE_CHECKING:
+    from my_iot.retention import Retention  # the latter depends on this module
+
+
+class Rollup:
+    """
+    Aggregate of float readings within a time bucket.
+    """
+
+    __slots__ = ('timestamp', 'count', 'min', 'max', 'sum')
+
+    def __init__(self, timestamp: float, count: int = 0, min_: float = inf, max_: float = -inf, sum_: float = 0.0):
+        self.timestamp = timestamp  # bucket start
+        self.count = count
+        self.min = min_
+        self.max = max_
+        self.sum = sum_
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> Rollup:
+        return Rollup(*raw)
+
+    def to_raw(self) -> Any:
+        return [self.timestamp, self.count, self.min, self.max, self.sum]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_values(self, values: Sequence[float]):
+        if not values:
+            return
+        self.count += len(values)
+        self.sum += sum(values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+
+    def replace(self, previous: float, value: float):
+        """
+        Account for a reading which has been overwritten.
+        The minimum and the maximum may only widen since the other readings are unknown here.
+        """
+        self.sum += value - previous
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: Rollup):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+def get_bucket_start(timestamp: float, resolution: timedelta) -> datetime:
+    """
+    Get start time of the rollup bucket which contains the timestamp.
+    """
+    seconds = resolution.total_seconds()
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, timezone.utc)
+
+
+def choose_resolution(
+    period: timedelta,
+    n_buckets: int,
+    retention: Optional[Retention] = None,
+    age: Optional[timedelta] = None,
+) -> Optional[str]:
+    """
+    Choose the coarsest rollup resolution which still gives at least `n_buckets` buckets within the period.
+    Returns `None` if the raw readings should be used instead.
+
+    If the retention policy is specified, a coarser resolution is chosen when the finer one isn't kept
+    for `age`, that is since the period start till now, which is the period length by default.
+    """
+    chosen = None
+    for name, resolution in ROLLUP_RESOLUTIONS.items():
+        if period / resolution < n_buckets:
+            break
+        chosen = name
+    if retention is None:
+        return chosen
+    age = age if age is not None else period
+    candidates = [None, *ROLLUP_RESOLUTIONS]
+    candidates = candidates[candidates.index(chosen):]
+    for name in candidates:
+        kept = retention.raw if name is None else retention.rollups.get(name)
+        if kept is None or kept >= age:
+            return name
+    return candidates[-1]  # nothing covers the period, so the coarsest one gives the most
+
+
+def aggregate(columns: Iterable[Tuple[Sequence[float], Sequence[float]]], resolution: timedelta) -> Iterator[Rollup]:
+    """
+    Aggregate the sorted columns into rollups of the specified resolution.
+    """
+    seconds = resolution.total_seconds()
+    rollup: Optional[Rollup] = None
+    for timestamps, values in columns:
+        start = 0
+        while start < len(timestamps):
+            bucket_start = get_bucket_start(timestamps[start], resolution).timestamp()
+            if rollup is None or rollup.timestamp != bucket_start:
+                if rollup is not None:
+                    yield rollup
+                rollup = Rollup(bucket_start)
+            stop = bisect_left(timestamps, bucket_start + seconds, start)
+            rollup.add_values(values[start:stop])
+            start = stop
+    if rollup is not None:
+        yield rollup
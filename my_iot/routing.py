@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import re
-from asyncio import CancelledError
+from asyncio import CancelledError, Future, Task, create_task, gather, get_running_loop, wait_for
+from collections import defaultdict, deque
+from contextlib import suppress
+from datetime import timedelta
+from enum import Enum
 from functools import wraps
-from typing import Any, Awaitable, Callable, List, Mapping, Optional
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping, Optional, Pattern, Set, Tuple
 
 from loguru import logger
 
+from my_iot.metrics import Histogram, Value, handler_errors_total, handler_seconds
+from my_iot.tracing import Trace
 from my_iot.types_ import Event
 
 AsyncCallable = Callable[..., Awaitable]
@@ -17,26 +25,196 @@ DecorateAsyncCallable = Callable[[AsyncCallable], AsyncCallable]
 class EventRouter:
     """
     Routes events to their corresponding handlers in an automation module.
+    Handlers are indexed by the channel conditions found at registration time,
+    so that an event only reaches the handlers which may accept its channel.
     """
 
-    def __init__(self):
+    def __init__(self, concurrent: bool = True):
+        # Run the handlers of an event concurrently rather than one after another.
+        self.concurrent = concurrent
+
+        # Number of the handler invocations which haven't finished yet.
+        self.n_running = 0
+
         self.handlers: List[AsyncCallable] = []
 
+        # Handlers by the exact channel.
+        self.exact: Dict[str, List[AsyncCallable]] = defaultdict(list)
+
+        # Handlers with a channel regular expression.
+        self.patterns: List[Tuple[Pattern, AsyncCallable]] = []
+
+        # Handlers without any channel condition.
+        self.generic: List[AsyncCallable] = []
+
+        # Candidate handlers by channel, in the registration order.
+        self.candidates: Dict[str, List[AsyncCallable]] = {}
+
+        # Latency histogram and error counter of every handler.
+        self.metrics: Dict[AsyncCallable, Tuple[Histogram, Value]] = {}
+
     def __call__(self, callable_: AsyncCallable):
         """
         Add the handler.
         """
         self.handlers.append(callable_)
+        channels: Set[str] = getattr(callable_, 'channels', set())
+        regexes: List[Pattern] = getattr(callable_, 'channel_regexes', [])
+        if channels:
+            # Any exact channel will do: the handler checks the rest on its own.
+            self.exact[next(iter(channels))].append(callable_)
+        elif regexes:
+            self.patterns.append((regexes[0], callable_))
+        else:
+            self.generic.append(callable_)
+        self.candidates.clear()
         return callable_
 
-    async def on_event(self, **kwargs: Any):
-        for handler in self.handlers:
-            try:
-                await handler(**kwargs)
-            except CancelledError:
-                logger.warning('Handler `{}` was interrupted.', handler)
-            except Exception as e:
-                logger.opt(exception=e).error('Error in handler `{}`.', handler)
+    def get_candidates(self, channel: str) -> List[AsyncCallable]:
+        """
+        Get handlers which may accept the channel.
+        """
+        candidates = self.candidates.get(channel)
+        if candidates is None:
+            matching = {
+                *self.exact.get(channel, ()),
+                *(handler for regex, handler in self.patterns if regex.fullmatch(channel)),
+                *self.generic,
+            }
+            candidates = self.candidates[channel] = [handler for handler in self.handlers if handler in matching]
+        return candidates
+
+    async def on_event(self, *, event: Event, trace: Optional[Trace] = None, **kwargs: Any):
+        """
+        Call the handlers. The trace, if any, gets a span per handler.
+        """
+        candidates = self.get_candidates(event.channel)
+        if self.concurrent:
+            await gather(*[self.call(handler, trace, event=event, **kwargs) for handler in candidates])
+        else:
+            for handler in candidates:
+                await self.call(handler, trace, event=event, **kwargs)
+
+    def get_metrics(self, handler: AsyncCallable) -> Tuple[Histogram, Value]:
+        metrics = self.metrics.get(handler)
+        if metrics is None:
+            name = getattr(handler, '__qualname__', None) or repr(handler)
+            metrics = self.metrics[handler] = (handler_seconds.labels(name), handler_errors_total.labels(name))
+        return metrics
+
+    async def call(self, handler: AsyncCallable, trace: Optional[Trace] = None, **kwargs: Any):
+        latency, errors = self.get_metrics(handler)
+        self.n_running += 1
+        start_time = perf_counter()
+        try:
+            await handler(**kwargs)
+        except CancelledError:
+            logger.warning('Handler `{}` was interrupted.', handler)
+            errors.inc()
+        except Exception as e:
+            logger.opt(exception=e).error('Error in handler `{}`.', handler)
+            errors.inc()
+        finally:
+            self.n_running -= 1
+            latency.observe(perf_counter() - start_time)
+            if trace is not None:
+                trace.mark(getattr(handler, '__qualname__', None) or repr(handler))
+
+
+class HandlerOverflow(str, Enum):
+    """
+    Tells what to do when a handler has too many running invocations.
+    """
+    DROP_OLDEST = 'DROP_OLDEST'  # cancel the oldest invocation
+    COALESCE = 'COALESCE'  # delay the invocation, only the latest delayed one is eventually run
+
+
+class Limiter:
+    """
+    Wraps a handler and limits its execution time and the number of its running invocations.
+    """
+
+    def __init__(
+        self,
+        callable_: AsyncCallable,
+        timeout: Optional[timedelta],
+        max_running: Optional[int],
+        overflow: HandlerOverflow,
+    ):
+        self.callable_ = callable_
+        self.timeout = timeout.total_seconds() if timeout is not None else None
+        self.max_running = max_running
+        self.overflow = overflow
+
+        self.running: Deque[Task] = deque()
+
+        # Delayed invocation arguments and the future of its result.
+        self.delayed: Optional[Tuple[Dict[str, Any], Future]] = None
+
+    async def __call__(self, **kwargs: Any):
+        if self.max_running is None or len(self.running) < self.max_running:
+            return await self.start(kwargs)
+        if self.overflow == HandlerOverflow.DROP_OLDEST:
+            logger.warning('Cancelling the oldest invocation of `{}`.', self.callable_)
+            self.running.popleft().cancel()
+            return await self.start(kwargs)
+        if self.delayed is not None:
+            self.delayed[1].set_result(None)  # superseded by the current invocation
+        future = self.delayed = (kwargs, get_running_loop().create_future())
+        return await future[1]
+
+    def start(self, kwargs: Dict[str, Any]) -> Task:
+        task = create_task(self.run(kwargs))
+        self.running.append(task)
+        task.add_done_callback(self.on_done)
+        return task
+
+    async def run(self, kwargs: Dict[str, Any]):
+        if self.timeout is None:
+            return await self.callable_(**kwargs)
+        try:
+            return await wait_for(self.callable_(**kwargs), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning('`{}` has timed out.', self.callable_)
+
+    def on_done(self, task: Task):
+        with suppress(ValueError):
+            self.running.remove(task)
+        if self.delayed is None:
+            return
+        kwargs, future = self.delayed
+        self.delayed = None
+        self.start(kwargs).add_done_callback(lambda delayed_task: copy_result(delayed_task, future))
+
+
+def copy_result(task: Task, future: Future):
+    if future.done():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def with_limits(
+    timeout: Optional[timedelta] = None,
+    max_running: Optional[int] = None,
+    overflow: HandlerOverflow = HandlerOverflow.COALESCE,
+) -> DecorateAsyncCallable:
+    """
+    Limits the handler execution time and the number of its running invocations.
+    Should go below the conditions, so that only the accepted events count.
+    """
+    def decorate(callable_: AsyncCallable) -> AsyncCallable:
+        limiter = Limiter(callable_, timeout, max_running, overflow)
+
+        @wraps(callable_)
+        async def wrapper(**kwargs):
+            return await limiter(**kwargs)
+        return wrapper
+    return decorate
 
 
 def if_(predicate: Predicate) -> DecorateAsyncCallable:
@@ -53,15 +231,36 @@ def if_(predicate: Predicate) -> DecorateAsyncCallable:
     return decorate
 
 
+def if_channel(channel: str) -> DecorateAsyncCallable:
+    """
+    Tests if the current channel equals to the specified one.
+    """
+    def predicate(event: Event, **_: Any) -> bool:
+        return event.channel == channel
+
+    def decorate(callable_: AsyncCallable) -> AsyncCallable:
+        wrapper = if_(predicate)(callable_)
+        wrapper.channels = {*getattr(callable_, 'channels', ()), channel}
+        return wrapper
+    return decorate
+
+
 def if_channel_like(regex: str) -> DecorateAsyncCallable:
     """
     Tests if the current channel matches the regular expression.
     """
+    if re.escape(regex) == regex:
+        return if_channel(regex)  # no special characters, so it's just a channel
     compiled_regex = re.compile(regex)
 
     def predicate(event: Event, **_: Any) -> bool:
         return bool(compiled_regex.fullmatch(event.channel))
-    return if_(predicate)
+
+    def decorate(callable_: AsyncCallable) -> AsyncCallable:
+        wrapper = if_(predicate)(callable_)
+        wrapper.channel_regexes = [*getattr(callable_, 'channel_regexes', ()), compiled_regex]
+        return wrapper
+    return decorate
 
 
 def if_newer(callable_: AsyncCallable) -> AsyncCallable:
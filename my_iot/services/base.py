@@ -3,10 +3,14 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 from typing import AsyncIterable
 
+from my_iot.http_ import HttpClients
 from my_iot.types_ import Event
 
 
 class Service(metaclass=ABCMeta):
+    # Shared HTTP client sessions. Set by the context before the service is run.
+    http: HttpClients
+
     @property
     @abstractmethod
     async def events(self) -> AsyncIterable[Event]:
@@ -1,14 +1,14 @@
 from __future__ import annotations
 
-from asyncio import sleep
+from asyncio import Lock, sleep
 from datetime import datetime, timedelta
-from typing import Any, Iterable
+from time import monotonic
+from typing import Any, Dict, Iterable, Optional
 
 from aiohttp import ClientSession
 from loguru import logger
 from pytz import timezone
 
-from my_iot.constants import HTTP_TIMEOUT
 from my_iot.services.base import Service
 from my_iot.types_ import Event, Unit
 
@@ -29,6 +29,66 @@ channels = (
 )
 
 
+class Snapshot:
+    """
+    Parsed feed along with the measurements indexed by station ID.
+    """
+
+    def __init__(self, feed: Any, etag: Optional[str], last_modified: Optional[str]):
+        self.feed = feed
+        self.measurements: Dict[int, Any] = {
+            measurement['stationid']: measurement
+            for measurement in feed['actual']['stationmeasurements']
+        }
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = monotonic()
+
+
+class Feed:
+    """
+    Downloads the feed once for all the `Buienradar` services.
+    Unchanged feed isn't downloaded again thanks to the conditional requests.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[Snapshot] = None
+        self.lock: Optional[Lock] = None  # created in the running loop, since the feed is a module-level singleton
+
+    async def get(self, session: ClientSession, max_age: float) -> Snapshot:
+        """
+        Get the snapshot which has been fetched at most `max_age` seconds ago.
+        Concurrent calls wait for the same download.
+        """
+        if self.lock is None:
+            self.lock = Lock()
+        async with self.lock:
+            if self.snapshot is None or monotonic() - self.snapshot.fetched_at >= max_age:
+                self.snapshot = await self.fetch(session, self.snapshot)
+            return self.snapshot
+
+    @staticmethod
+    async def fetch(session: ClientSession, snapshot: Optional[Snapshot]) -> Snapshot:
+        conditional_headers = {}
+        if snapshot is not None and snapshot.etag:
+            conditional_headers['If-None-Match'] = snapshot.etag
+        if snapshot is not None and snapshot.last_modified:
+            conditional_headers['If-Modified-Since'] = snapshot.last_modified
+        async with session.get(url, headers=conditional_headers) as response:
+            if snapshot is not None and response.status == 304:
+                logger.debug('The feed has not been modified.')
+                snapshot.fetched_at = monotonic()
+                return snapshot
+            response.raise_for_status()
+            # FIXME: use `pydantic` for the feed.
+            feed = await response.json()
+            return Snapshot(feed, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+
+# Feed singleton shared by all the stations.
+shared_feed = Feed()
+
+
 class Buienradar(Service):
     def __init__(self, station_id: int, interval=timedelta(seconds=300.0)):
         self.station_id = station_id
@@ -36,17 +96,18 @@ class Buienradar(Service):
 
     @property
     async def events(self):
-        async with ClientSession(headers=headers, timeout=HTTP_TIMEOUT) as session:
-            while True:
-                async with session.get(url, headers=headers) as response:
-                    # FIXME: use `pydantic` for the feed.
-                    feed = await response.json()
-                for event in self.yield_events(feed):
-                    yield event
-                logger.debug('Next reading in {interval} seconds.', interval=self.interval)
-                await sleep(self.interval)
-
-    def yield_events(self, feed: Any) -> Iterable[Event]:
+        session = self.http.get_session('buienradar', headers=headers)
+        while True:
+            snapshot = await shared_feed.get(session, self.interval)
+            for event in self.yield_events(snapshot):
+                yield event
+            # Wake up when the snapshot expires, so that the stations with the same interval share the downloads.
+            delay = max(snapshot.fetched_at + self.interval - monotonic(), 0.0)
+            logger.debug('Next reading in {delay:.1f} seconds.', delay=delay)
+            await sleep(delay)
+
+    def yield_events(self, snapshot: Snapshot) -> Iterable[Event]:
+        feed = snapshot.feed
         if feed['actual']['sunrise']:
             sunrise = parse_datetime(feed['actual']['sunrise'])
             yield Event(
@@ -77,7 +138,7 @@ class Buienradar(Service):
                 title='Day Length',
             )
         try:
-            measurement = self.find_measurement(feed)
+            measurement = snapshot.measurements[self.station_id]
         except KeyError as e:
             logger.error('Station ID {} is not found.', e)
             return
@@ -91,12 +152,6 @@ class Buienradar(Service):
                 title=f'{measurement["stationname"]} {title}',
             )
 
-    def find_measurement(self, feed: Any) -> Any:
-        for measurement in feed['actual']['stationmeasurements']:
-            if measurement['stationid'] == self.station_id:
-                return measurement
-        raise KeyError(self.station_id)
-
     def __str__(self) -> str:
         return f'{Buienradar.__name__}(station_id={self.station_id!r})'
 
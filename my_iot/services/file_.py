@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-from asyncio import sleep
+import asyncio
+from asyncio import sleep, wait_for
 from datetime import timedelta
 from pathlib import Path
 from typing import Any, Optional
 
 from loguru import logger
 
+from my_iot.inotify import watcher
 from my_iot.services.base import Service
 from my_iot.types_ import Event, Unit
 
@@ -21,18 +23,35 @@ class File(Service):
 
     @property
     async def events(self):
+        """
+        Read the file whenever it changes, but at least once per `interval`.
+        Files that can't be watched, such as the ones in `/sys`, are just read once per `interval`.
+        """
+        subscription = watcher.subscribe(self.path)
+        if subscription is None:
+            logger.debug('{} is polled.', self)
         try:
-            yield Event(
-                channel=f'file:{self.sub_channel}',
-                value=self.preprocess_value(self.path.read_text()),
-                unit=self.unit,
-                title=self.title,
-            )
-        except IOError as e:
-            logger.error('I/O error in {channel}:', channel=self)
-            logger.error('{e}', e=e)
-        logger.debug('Next reading in {interval} seconds.', interval=self.interval)
-        await sleep(self.interval)
+            while True:
+                try:
+                    yield Event(
+                        channel=f'file:{self.sub_channel}',
+                        value=self.preprocess_value(self.path.read_text()),
+                        unit=self.unit,
+                        title=self.title,
+                    )
+                except IOError as e:
+                    logger.error('I/O error in {channel}:', channel=self)
+                    logger.error('{e}', e=e)
+                if subscription is None:
+                    await sleep(self.interval)
+                    continue
+                try:
+                    await wait_for(subscription.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if subscription is not None:
+                subscription.close()
 
     def preprocess_value(self, value: str) -> Any:
         return value
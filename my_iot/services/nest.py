@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Iterable, List, Tuple
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Tuple
 
 from aiohttp_sse_client.client import EventSource, MessageEvent
 from loguru import logger
@@ -14,21 +15,43 @@ from my_iot.types_ import Event, Unit
 url = 'https://developer-api.nest.com'
 headers = MultiDict([('Accept', 'text/event-stream')])
 timestamp_format = '%Y-%m-%dT%H:%M:%S.%f%z'
+missing = object()
 
 
 class Nest(Service):
-    def __init__(self, token: str):
+    def __init__(self, token: str, refresh_interval=timedelta(minutes=15)):
         self.token = token
         self.params = {'auth': self.token}
+        self.refresh_interval = refresh_interval.total_seconds()
 
     @property
     async def events(self):
+        """
+        Every `put` message contains all the fields, but only the changed ones are emitted.
+        All the fields are emitted once per `refresh_interval` anyway.
+        """
+        # Latest emitted values by channel.
+        snapshot: Dict[str, Any] = {}
+        refreshed_at = monotonic()
+
         logger.info('Connecting to the streaming API…')
-        async with EventSource(url, params=self.params, headers=headers, timeout=None) as source:
+        async with EventSource(
+            url,
+            session=self.http.get_session(),
+            params=self.params,
+            headers=headers,
+            timeout=None,
+        ) as source:
             logger.info('Connected.')
             async for server_event in source:
-                if server_event.type == 'put':
-                    for event in yield_events(server_event):
+                if server_event.type != 'put':
+                    continue
+                if monotonic() - refreshed_at >= self.refresh_interval:
+                    snapshot.clear()
+                    refreshed_at = monotonic()
+                for event in yield_events(server_event):
+                    if snapshot.get(event.channel, missing) != event.value:
+                        snapshot[event.channel] = event.value
                         yield event
 
     def __str__(self) -> str:
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+from asyncio import get_running_loop, sleep
+from datetime import datetime, timezone
+from heapq import merge
+from pathlib import Path
+from time import monotonic
+from typing import Iterable, Iterator, List, Optional
+
+import ujson
+from loguru import logger
+from sqlitemap import Connection
+
+from my_iot.constants import DATABASE_OPTIONS
+from my_iot.database import get_actual, iter_log
+from my_iot.services.base import Service
+from my_iot.types_ import Event
+
+
+class Replay(Service):
+    """
+    Replays the recorded events with their original gaps, divided by `speed`.
+    The events are stamped with the current time, so that the pipeline handles them as the live ones.
+    """
+
+    def __init__(self, speed: float = 1.0, channel_prefix: str = 'replay:', repeat: bool = False):
+        if speed <= 0.0:
+            raise ValueError('`speed` must be positive.')
+        self.speed = speed
+        self.channel_prefix = channel_prefix
+        self.repeat = repeat
+
+    @abstractmethod
+    def iter_recording(self) -> Iterator[Event]:
+        """
+        Iterate over the recorded events in the timestamp order.
+        """
+        raise NotImplementedError()
+
+    @property
+    async def events(self):
+        while True:
+            n_events = 0
+            start_time = monotonic()
+            first_timestamp: Optional[float] = None
+            for event in self.iter_recording():
+                timestamp = event.timestamp.timestamp()
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                # Sleep at least once in a while, otherwise a replay which falls behind would stall the event loop.
+                await sleep(max((timestamp - first_timestamp) / self.speed - (monotonic() - start_time), 0.0))
+                n_events += 1
+                yield Event(
+                    channel=f'{self.channel_prefix}{event.channel}',
+                    value=event.value,
+                    unit=event.unit,
+                    title=event.title,
+                    timestamp=datetime.now(timezone.utc),
+                )
+            logger.info('{} has replayed {} events in {:.1f} seconds.', self, n_events, monotonic() - start_time)
+            if not self.repeat or not n_events:
+                break
+        await get_running_loop().create_future()  # the service would be restarted otherwise
+
+
+class JsonLinesReplay(Replay):
+    """
+    Replays the events from a JSON Lines file, one event per line in the same JSON format as the live events API sends.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0, channel_prefix: str = 'replay:', repeat: bool = False):
+        super().__init__(speed, channel_prefix, repeat)
+        self.path = path
+
+    def iter_recording(self) -> Iterator[Event]:
+        with open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield Event(**ujson.loads(line))
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}(path={str(self.path)!r}, speed={self.speed!r})'
+
+
+class DatabaseReplay(Replay):
+    """
+    Replays the channel logs from a copy of a My IoT database.
+    The channels keep the units and the titles of their actual values.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        channels: Iterable[str],
+        since: datetime,
+        until: Optional[datetime] = None,
+        speed: float = 1.0,
+        channel_prefix: str = 'replay:',
+        repeat: bool = False,
+    ):
+        super().__init__(speed, channel_prefix, repeat)
+        self.path = path
+        self.channels = list(channels)
+        self.since = since
+        self.until = until
+
+    def iter_recording(self) -> Iterator[Event]:
+        db = Connection(str(self.path), **DATABASE_OPTIONS)
+        try:
+            actual = get_actual(db)
+            logs: List[Iterator[Event]] = []
+            for channel in self.channels:
+                event = actual.get(channel)
+                if event is None:
+                    logger.warning('{} has no channel `{}`.', self, channel)
+                    continue
+                logs.append(self.iter_channel(db, event))
+            yield from merge(*logs, key=lambda event: event.timestamp)
+        finally:
+            db.close()
+
+    def iter_channel(self, db: Connection, actual: Event) -> Iterator[Event]:
+        for reading in iter_log(db, actual.channel, self.since, self.until):
+            yield reading.to_event(channel=actual.channel, unit=actual.unit, title=actual.title)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}(path={str(self.path)!r}, channels={self.channels!r}, speed={self.speed!r})'
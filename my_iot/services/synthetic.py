@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from asyncio import sleep
+from itertools import count
+from random import Random
+from time import monotonic
+from typing import Optional
+
+from my_iot.services.base import Service
+from my_iot.types_ import Event, Unit
+
+
+class RandomWalk(Service):
+    """
+    Generates synthetic load: the channels take turns to emit random walk values at `rate` events per second in total.
+    """
+
+    def __init__(
+        self,
+        sub_channel: str,
+        n_channels: int,
+        rate: float,
+        unit: Unit = Unit.CELSIUS,
+        initial_value: float = 20.0,
+        step: float = 0.1,
+        seed: Optional[int] = None,
+    ):
+        if rate <= 0.0:
+            raise ValueError('`rate` must be positive.')
+        self.sub_channel = sub_channel
+        self.n_channels = n_channels
+        self.rate = rate
+        self.unit = unit
+        self.step = step
+        self.random = Random(seed)
+        self.values = [initial_value] * n_channels
+        self.channels = [f'random:{sub_channel}:{i}' for i in range(n_channels)]
+
+    @property
+    async def events(self):
+        start_time = monotonic()
+        for i in count():
+            # Keep the average rate. Sleep anyway when falling behind, so that the event loop isn't stalled.
+            await sleep(max(i / self.rate - (monotonic() - start_time), 0.0))
+            index = i % self.n_channels
+            self.values[index] += self.random.gauss(0.0, self.step)
+            yield Event(channel=self.channels[index], value=self.values[index], unit=self.unit)
+
+    def __str__(self) -> str:
+        return f'{self.__class__.__name__}(sub_channel={self.sub_channel!r}, rate={self.rate!r})'
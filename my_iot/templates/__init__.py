@@ -1,23 +1,57 @@
 from __future__ import annotations
 
+import os
 from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
 
 import aiohttp_jinja2
 import pprintpp
 from aiohttp.web_app import Application
-from jinja2 import PackageLoader, select_autoescape
-
-from my_iot.types_ import Unit
-
-
-def setup(app: Application):
-    env = aiohttp_jinja2.setup(app, loader=PackageLoader('my_iot'), autoescape=select_autoescape())
+from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader, select_autoescape
+from markupsafe import Markup
+
+from my_iot.types_ import Event, Unit
+
+
+def setup(app: Application, cache_path: Optional[str] = None):
+    """
+    Set up the templates. Compiled templates are kept in the cache directory, if specified, between restarts.
+    """
+    if cache_path is not None:
+        os.makedirs(cache_path, exist_ok=True)
+    env = aiohttp_jinja2.setup(
+        app,
+        loader=PackageLoader('my_iot'),
+        autoescape=select_autoescape(),
+        bytecode_cache=(FileSystemBytecodeCache(cache_path) if cache_path is not None else None),
+    )
     env.globals['Unit'] = Unit
+    env.globals['render_tile'] = TileCache(env)
     env.filters['fromseconds'] = from_seconds
     env.filters['fromtimestamp'] = from_timestamp
     env.filters['pprint'] = pprintpp.pformat
 
 
+class TileCache:
+    """
+    Renders the channel tiles and keeps the latest tile of every channel along with its event.
+    The tile is re-rendered as soon as the channel gets a different event.
+    """
+
+    def __init__(self, env: Environment):
+        self.env = env
+        self.tiles: Dict[str, Tuple[Event, Markup]] = {}
+
+    def __call__(self, event: Event) -> Markup:
+        cached = self.tiles.get(event.channel)
+        # The actual value is normally the very same event, the comparison is still cheaper than rendering.
+        if cached is not None and (cached[0] is event or cached[0] == event):
+            return cached[1]
+        tile = Markup(self.env.get_template('includes/tile.html').render(event=event))
+        self.tiles[event.channel] = (event, tile)
+        return tile
+
+
 def from_timestamp(timestamp: float) -> str:
     return datetime.fromtimestamp(timestamp).astimezone().strftime('%b %d, %H:%M:%S')
 
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+from collections import deque
+from datetime import timedelta
+from random import random
+from time import perf_counter, time
+from typing import Deque, List, Optional, Tuple
+
+from loguru import logger
+from ujson import dumps
+
+from my_iot.constants import TRACE_BACKUP_COUNT, TRACE_HISTORY_SIZE, TRACE_MAX_BYTES, TRACE_THRESHOLD
+from my_iot.types_ import Event
+
+
+class Trace:
+    """
+    Timeline of a single event in the pipeline.
+    """
+
+    __slots__ = ('channel', 'started_at', 'lag', 'start_time', 'spans')
+
+    def __init__(self, event: Event):
+        self.channel = event.channel
+        self.started_at = time()
+
+        # Time from the event creation till the pipeline has got it, that is spent in the service and the queue.
+        self.lag = self.started_at - event.timestamp.timestamp()
+
+        self.start_time = perf_counter()
+
+        # Names of the finished steps along with their time since the start, in seconds.
+        self.spans: List[Tuple[str, float]] = []
+
+    def mark(self, name: str):
+        """
+        Mark the step as finished.
+        """
+        self.spans.append((name, perf_counter() - self.start_time))
+
+    @property
+    def duration(self) -> float:
+        return self.spans[-1][1] if self.spans else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'channel': self.channel,
+            'started_at': self.started_at,
+            'lag': self.lag,
+            'duration': self.duration,
+            'spans': self.spans,
+        }
+
+
+class Tracer:
+    """
+    Traces a sample of the events. The slow traces are kept in memory and optionally written to a JSON Lines file.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        threshold: timedelta = TRACE_THRESHOLD,
+        path: Optional[str] = None,
+        history_size: int = TRACE_HISTORY_SIZE,
+    ):
+        self.sample_rate = sample_rate
+        self.threshold = threshold.total_seconds()
+        self.path = path
+        self.slow: Deque[Trace] = deque(maxlen=history_size)
+        self.n_traced = 0
+
+        # Slow traces go to a dedicated Loguru sink, which writes them in the background.
+        self.sink_id = add_sink(path) if path is not None else None
+        self.file_logger = logger.bind(trace_path=path)
+
+    def start(self, event: Event) -> Optional[Trace]:
+        """
+        Start the event trace. Returns `None` if the event isn't sampled.
+        """
+        if not self.sample_rate or random() >= self.sample_rate:
+            return None
+        self.n_traced += 1
+        return Trace(event)
+
+    def finish(self, trace: Trace):
+        """
+        Finish the trace and keep it if it's slow.
+        """
+        trace.mark('finished')
+        if trace.duration < self.threshold:
+            return
+        self.slow.append(trace)
+        if self.sink_id is not None:
+            self.file_logger.info('{}', dumps(trace.to_dict()))
+
+    def get_slowest(self) -> List[Trace]:
+        return sorted(self.slow, key=lambda trace: trace.duration, reverse=True)
+
+    def close(self):
+        if self.sink_id is not None:
+            logger.remove(self.sink_id)  # waits for the pending traces to be written
+            self.sink_id = None
+
+
+def add_sink(path: str) -> int:
+    """
+    Add the sink which writes the plain messages bound to the path into the rotating file.
+    """
+    return logger.add(
+        path,
+        format='{message}',
+        filter=(lambda record: record['extra'].get('trace_path') == path),
+        rotation=TRACE_MAX_BYTES,
+        retention=TRACE_BACKUP_COUNT,
+        enqueue=True,
+    )
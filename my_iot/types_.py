@@ -67,3 +67,30 @@ class Event(BaseModel):
         Sets the current timestamp by default.
         """
         return value or datetime.now(timezone.utc)
+
+
+class Reading:
+    """
+    Lightweight log item which is used internally instead of `Event`.
+    Unlike the latter, it isn't validated and keeps the timestamp as a POSIX one.
+    """
+
+    __slots__ = ('timestamp', 'value')
+
+    def __init__(self, timestamp: float, value: Any):
+        self.timestamp = timestamp
+        self.value = value
+
+    def to_event(self, **kwargs: Any) -> Event:
+        """
+        Convert the reading for the automation or the templates. The other event fields are passed as is.
+        """
+        return Event(value=self.value, timestamp=datetime.fromtimestamp(self.timestamp, timezone.utc), **kwargs)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Reading):
+            return NotImplemented
+        return self.timestamp == other.timestamp and self.value == other.value
+
+    def __repr__(self) -> str:
+        return f'Reading(timestamp={self.timestamp!r}, value={self.value!r})'
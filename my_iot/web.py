@@ -1,19 +1,33 @@
 from __future__ import annotations
 
-from datetime import timedelta
-from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import re
+from asyncio import wait_for
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterable, Optional
 
 from aiohttp import web
-from aiohttp.web_exceptions import HTTPNotFound
+from aiohttp.web_exceptions import HTTPBadRequest, HTTPNotFound, HTTPNotModified
 from aiohttp_jinja2 import template
+from ujson import dumps
 
-from my_iot import templates
+from my_iot import metrics, templates
+from my_iot.assets import ASSETS
+from my_iot.broadcast import Item
 from my_iot.charts import make_float_chart
-from my_iot.constants import ACTUAL_KEY, DEFAULT_PERIOD, HTTP_PORT, STATICS
+from my_iot.constants import (
+    DEFAULT_PERIOD,
+    HTTP_PORT,
+    KEEPALIVE_INTERVAL,
+    LOG_PAGE_SIZE,
+    MAX_CHART_POINTS,
+    STATIC_CACHE_CONTROL,
+)
 from my_iot.context import Context
-from my_iot.database import get_actual, get_log
-from my_iot.helpers import run_in_executor
-from my_iot.types_ import Event
+from my_iot.database import get_downsampled_log, get_log, get_log_page, get_stats, timestamp_key
+from my_iot.retention import find_retention
+from my_iot.routing import router
 
 routes = web.RouteTableDef()
 
@@ -22,28 +36,43 @@ def start(
     context: Context,
     on_startup: Callable[[web.Application], Awaitable[Any]],
     on_cleanup: Callable[[web.Application], Awaitable[Any]],
+    template_cache_path: Optional[str] = None,
 ):
     """
     Start the web app.
     """
-    app = web.Application()
+    app = web.Application(middlewares=[measure_latency])
     app['context'] = context
     app.on_startup.append(on_startup)
     app.on_cleanup.append(on_cleanup)
     app.add_routes(routes)
 
-    templates.setup(app)
+    templates.setup(app, template_cache_path)
 
     # noinspection PyTypeChecker
     web.run_app(app, port=HTTP_PORT, print=None)
 
 
+@web.middleware
+async def measure_latency(request: web.Request, handler: Callable[[web.Request], Awaitable[web.StreamResponse]]):
+    """
+    Collect the request latency per route.
+    """
+    start_time = perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        metrics.http_request_seconds.labels(route).observe(perf_counter() - start_time)
+
+
 @routes.get(r'/')
 @template('index.html')
 async def get_index(request: web.Request) -> dict:
     context: Context = request.app['context']
     return {
-        'actual': (await run_in_executor(get_actual, context.db)).values(),
+        'actual': context.actual.values(),
     }
 
 
@@ -53,25 +82,30 @@ async def get_channel(request: web.Request) -> dict:
     context: Context = request.app['context']
     channel: str = request.match_info['channel']
     try:
-        raw_event: Dict[Any, Any] = context.db[ACTUAL_KEY][channel]
+        event = context.actual[channel]
     except KeyError:
         raise HTTPNotFound(text='Channel is not found.')
-    event = Event(**raw_event)
     try:
         period = timedelta(seconds=abs(int(request.query.get('period'))))
     except (TypeError, ValueError):
         period = DEFAULT_PERIOD
-    events = await run_in_executor(get_log, context.db, channel, period)
-    chart = None
-    if events:
-        if event.unit.is_float:
-            chart = await run_in_executor(make_float_chart, events)
+    chart = stats = None
+    if event.unit.is_float:
+        retention = find_retention(context.retention, channel, event.unit)
+        timestamps, values = await context.read(get_downsampled_log, channel, period, MAX_CHART_POINTS, None, retention)
+        has_events = bool(timestamps)
+        if has_events:
+            chart = make_float_chart(timestamps, values)
+            stats = await context.read(get_stats, channel, period, retention)
+    else:
+        has_events = bool(await context.read(get_log, channel, period))
     return {
         'chart': chart,
         'event': event,
-        'has_events': bool(events),
-        'raw_event': raw_event,
+        'has_events': has_events,
+        'raw_event': event.dict(),
         'request': request,
+        'stats': stats,
     }
 
 
@@ -81,18 +115,184 @@ async def get_events(request: web.Request) -> dict:
     return {'request': request}
 
 
+@routes.get(r'/api/events')
+async def get_live_events(request: web.Request) -> web.StreamResponse:
+    """
+    Push the events as server-sent events.
+
+    Query parameter `channel` is a regular expression which the channels must fully match.
+    A new client gets the recent events first. A reconnecting one only gets those it hasn't seen yet.
+    """
+    context: Context = request.app['context']
+    try:
+        subscriber = context.broadcaster.subscribe(request.query.get('channel'))
+    except re.error:
+        raise HTTPBadRequest(text='Invalid channel regular expression.')
+    try:
+        after = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        after = 0
+    try:
+        response = web.StreamResponse(headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.content_type = 'text/event-stream'
+        await response.prepare(request)
+        await response.write(dump_live_events(context.broadcaster.iter_recent(subscriber, after)))
+        while True:
+            try:
+                items = await wait_for(subscriber.get(), KEEPALIVE_INTERVAL.total_seconds())
+            except asyncio.TimeoutError:
+                await response.write(b': keep-alive\n\n')
+                continue
+            if not items:
+                break  # the subscriber is too slow or the app is stopping
+            await response.write(dump_live_events(items))
+    finally:
+        context.broadcaster.unsubscribe(subscriber)
+    return response
+
+
+def dump_live_events(items: Iterable[Item]) -> bytes:
+    return b''.join(f'id: {id_}\ndata: {event.json()}\n\n'.encode() for id_, event in items)
+
+
 @routes.get(r'/services')
 @template('services.html')
 async def get_services(request: web.Request) -> dict:
-    return {'services': request.app['context'].services}
+    context: Context = request.app['context']
+    return {
+        'services': context.services,
+        'stats': context.queue.stats,
+        'queue': context.queue,
+        'http': context.http,
+    }
 
 
-# Must go at the end.
-@routes.get(r'/{name:.+}')
-async def get_static(request: web.Request) -> web.Response:
+@routes.get(r'/debug/slow')
+@template('slow.html')
+async def get_slow_traces(request: web.Request) -> dict:
+    context: Context = request.app['context']
+    return {
+        'tracer': context.tracer,
+        'traces': context.tracer.get_slowest(),
+    }
+
+
+@routes.get(r'/api/channel/{channel}/log')
+async def get_channel_log(request: web.Request) -> web.StreamResponse:
+    """
+    Stream the channel log as a JSON array of `[timestamp, value]` pairs.
+
+    Query parameters `from` and `to` are POSIX timestamps, the last 5 minutes are returned by default.
+    Float channels are downsampled if `max_points` is specified.
+    The ETag consists of the key of the latest committed reading and the query, so it changes along with the log.
+    A sliding window, that is without `to`, isn't renewed until a new reading comes in, so the client is supposed
+    to drop the outdated readings itself.
+    """
+    context: Context = request.app['context']
+    channel: str = request.match_info['channel']
     try:
-        body = STATICS[request.match_info['name']]
+        event = context.actual[channel]  # only updated once the event is committed, so it's never ahead of the log
     except KeyError:
-        raise HTTPNotFound()
+        raise HTTPNotFound(text='Channel is not found.')
+    try:
+        until = parse_timestamp(request.query.get('to')) or datetime.now(timezone.utc)
+        since = parse_timestamp(request.query.get('from')) or (until - DEFAULT_PERIOD)
+        max_points = int(request.query['max_points']) if 'max_points' in request.query else None
+    except (ValueError, OverflowError, OSError):
+        raise HTTPBadRequest(text='Invalid query parameters.')
+    if max_points is not None and max_points < 1:
+        raise HTTPBadRequest(text='`max_points` must be positive.')
+
+    query = '-'.join(request.query.get(name, '') for name in ('from', 'to', 'max_points'))
+    etag = f'W/"{timestamp_key(event.timestamp)}-{query}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if is_not_modified(request, etag):
+        raise HTTPNotModified(headers=headers)
+
+    response = web.StreamResponse(headers=headers)
+    response.content_type = 'application/json'
+    await response.prepare(request)
+    await response.write(b'[')
+
+    if max_points is not None and event.unit.is_float:
+        retention = find_retention(context.retention, channel, event.unit)
+        timestamps, values = await context.read(
+            get_downsampled_log, channel, until - since, max_points, until, retention,
+        )
+        await response.write(dump_items(zip(timestamps, values)))
     else:
-        return web.Response(body=body)
+        # Read the log page by page, so that neither side keeps the entire log in memory.
+        separator = b''
+        while True:
+            page = await context.read(get_log_page, channel, since, until, LOG_PAGE_SIZE)
+            is_last_page = len(page) < LOG_PAGE_SIZE
+            if separator:
+                page = [reading for reading in page if reading.timestamp > since.timestamp()]  # already sent
+            if page:
+                await response.write(separator + dump_items([reading.timestamp, reading.value] for reading in page))
+                separator = b','
+                since = datetime.fromtimestamp(page[-1].timestamp, timezone.utc)
+            if is_last_page:
+                break
+
+    await response.write(b']')
+    await response.write_eof()
+    return response
+
+
+@routes.get(r'/metrics')
+async def get_metrics(request: web.Request) -> web.Response:
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    context: Context = request.app['context']
+    metrics.queue_depth.labels().set(context.queue.depth)
+    metrics.write_depth.labels().set(context.writer.depth)
+    metrics.routing_tasks.labels().set(len(context.routing_tasks))
+    metrics.handlers_running.labels().set(router.n_running)
+    return web.Response(text=metrics.render(), content_type='text/plain', headers={'Cache-Control': 'no-cache'})
+
+
+def dump_items(items: Iterable[Any]) -> bytes:
+    """
+    Dump the items as JSON array items without the brackets.
+    """
+    return dumps(list(items))[1:-1].encode()
+
+
+def is_not_modified(request: web.Request, etag: str) -> bool:
+    """
+    Check whether `If-None-Match` lists the ETag. The weak comparison is used as the standard requires.
+    """
+    header = request.headers.get('If-None-Match')
+    if header is None:
+        return False
+    tags = {strip_weak(tag.strip()) for tag in header.split(',')}
+    return '*' in tags or strip_weak(etag) in tags
+
+
+def strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromtimestamp(float(value), timezone.utc) if value is not None else None
+
+
+async def get_static(request: web.Request) -> web.Response:
+    """
+    Serve the static file, precompressed if the client accepts it.
+    """
+    asset = ASSETS[request.path[1:]]
+    headers = {'ETag': asset.etag, 'Cache-Control': STATIC_CACHE_CONTROL, 'Vary': 'Accept-Encoding'}
+    if is_not_modified(request, asset.etag):
+        raise HTTPNotModified(headers=headers)
+    encoding = asset.negotiate(request.headers.get('Accept-Encoding', ''))
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    body = asset.encodings[encoding] if encoding is not None else asset.body
+    return web.Response(body=body, content_type=asset.content_type, headers=headers)
+
+
+for name in ASSETS:
+    routes.get(f'/{name}')(get_static)
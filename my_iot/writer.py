@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from asyncio import Future, Lock, TimerHandle, create_task, get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import perf_counter
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from loguru import logger
+from sqlitemap import Connection
+
+from my_iot.compression import Compressor
+from my_iot.database import save_events
+from my_iot.helpers import run_in_executor
+from my_iot.metrics import write_seconds
+from my_iot.types_ import Event
+
+T = TypeVar('T')
+
+
+class EventWriter:
+    """
+    Write-behind stage in front of `save_events`.
+    Collects events and saves them in a single transaction
+    per `max_size` events or per `max_delay`, whichever comes first.
+
+    Owns the dedicated thread which performs all the database writes.
+    """
+
+    def __init__(
+        self,
+        db: Connection,
+        max_size: int = 1,
+        max_delay: timedelta = timedelta(),
+        compressor: Optional[Compressor] = None,
+    ):
+        self.db = db
+        self.max_size = max_size
+        self.max_delay = max_delay.total_seconds()
+
+        # Every transaction works with its fork, which is merged back once the transaction is committed.
+        self.compressor = compressor
+
+        # Pending events along with the futures that are resolved once the events are saved.
+        self.pending: List[Tuple[Event, Future]] = []
+
+        # Duration of the latest flush, in seconds.
+        self.flush_latency = 0.0
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        self.timer: Optional[TimerHandle] = None
+
+        # While a transaction is being committed, newly put events are collected into the next one.
+        self.lock = Lock()
+
+    @property
+    def depth(self) -> int:
+        """
+        Get the number of events waiting to be saved.
+        """
+        return len(self.pending)
+
+    def put(self, event: Event) -> Future:
+        """
+        Schedule the event to be saved.
+        Returns a future which is resolved once the event is committed.
+        """
+        loop = get_running_loop()
+        future = loop.create_future()
+        self.pending.append((event, future))
+        if len(self.pending) >= self.max_size:
+            self.schedule_flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_delay, self.schedule_flush)
+        return future
+
+    def schedule_flush(self):
+        # noinspection PyAsyncCall
+        create_task(self.flush())
+
+    async def flush(self):
+        """
+        Save all the pending events in a single transaction.
+        """
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, []
+
+            start_time = perf_counter()
+            # The compression state is only changed once the transaction is committed.
+            compressor = self.compressor.fork() if self.compressor is not None else None
+            try:
+                await run_in_executor(
+                    save_events,
+                    self.db,
+                    [event for event, _ in pending],
+                    compressor,
+                    executor=self.executor,
+                )
+            except Exception as e:
+                logger.opt(exception=e).error('Failed to save {} events.', len(pending))
+                for _, future in pending:
+                    if not future.done():  # the waiter may have been cancelled
+                        future.set_exception(e)
+            else:
+                if compressor is not None:
+                    self.compressor.merge(compressor)
+                for _, future in pending:
+                    if not future.done():
+                        future.set_result(None)
+            self.flush_latency = perf_counter() - start_time
+            write_seconds.labels().observe(self.flush_latency)
+
+        logger.debug(
+            'Saved {n} events in {latency:.1f} ms, {depth} pending.',
+            n=len(pending),
+            latency=(self.flush_latency * 1000.0),
+            depth=self.depth,
+        )
+
+    async def execute(self, callable_: Callable[..., T], *args: Any) -> T:
+        """
+        Run the callable on the writer thread in between the flushes.
+        """
+        async with self.lock:
+            return await run_in_executor(callable_, *args, executor=self.executor)
+
+    async def close(self):
+        """
+        Save the remaining events and stop the writer thread.
+        """
+        try:
+            await self.flush()
+        finally:
+            self.executor.shutdown()
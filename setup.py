@@ -9,7 +9,7 @@ setuptools.setup(
     long_description=open('README.md').read(),
     long_description_content_type='text/markdown',
     url='https://github.com/eigenein/my-iot',
-    packages=setuptools.find_packages(exclude=['tests']),
+    packages=setuptools.find_packages(exclude=['tests', 'benchmarks']),
     package_data={
         '': ['*'],
     },
@@ -30,6 +30,7 @@ setuptools.setup(
     ],
     extras_require={
         'dev': ['pip-tools', 'isort', 'ipython', 'twine', 'flake8', 'pytest'],
+        'brotli': ['brotli'],
     },
     entry_points={
         'console_scripts': [
@@ -12,13 +12,13 @@ from sqlitemap import Connection
 from my_iot import templates
 from my_iot.constants import DATABASE_OPTIONS
 from my_iot.imp_ import create_module
-from my_iot.web import Context, routes
+from my_iot.web import Context, measure_latency, routes
 
 pytest_plugins = 'aiohttp.pytest_plugin'
 
 
 @fixture
-async def db() -> Connection:
+def db() -> Connection:
     return Connection(':memory:', **DATABASE_OPTIONS)
 
 
@@ -33,7 +33,7 @@ async def automation() -> ModuleType:
 
 @fixture
 async def client(aiohttp_client: Callable[..., TestClient], automation: ModuleType, db: Connection) -> TestClient:
-    app = Application()
+    app = Application(middlewares=[measure_latency])
     # noinspection PyTypeChecker
     app['context'] = Context(automation=automation, db=db)
     app.add_routes(routes)
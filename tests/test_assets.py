@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from pytest import mark
+
+from my_iot.assets import Asset
+
+
+@mark.parametrize('accept_encoding, expected', [
+    ('', None),
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('gzip; q=0.0, *', None),
+    ('*', 'gzip'),
+    ('*;q=0', None),
+    ('br, *;q=0.1', 'gzip'),
+])
+def test_negotiate(accept_encoding: str, expected: Optional[str]):
+    asset = Asset(b'a' * 1000, 'text/plain')
+    asset.encodings.pop('br', None)  # `brotli` is optional
+    assert asset.negotiate(accept_encoding) == expected
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from my_iot.broadcast import Broadcaster
+from my_iot.types_ import Event
+
+
+async def test_broadcaster():
+    broadcaster = Broadcaster(history_size=2, subscriber_buffer_size=2)
+    subscriber = broadcaster.subscribe('test:.*')
+    for channel, value in [('test:a', 1), ('other', 2), ('test:b', 3), ('test:a', 4)]:
+        broadcaster.publish(Event(channel=channel, value=value))
+    assert [event.value for _, event in await subscriber.get()] == [3, 4]  # coalesced
+    assert list(broadcaster.iter_recent(subscriber)) == []  # already delivered as the pending events
+    assert [id_ for id_, _ in broadcaster.iter_recent(broadcaster.subscribe('test:.*'))] == [3, 4]
+
+    for channel in ('test:a', 'test:b', 'test:c'):
+        broadcaster.publish(Event(channel=channel, value=0))
+    assert subscriber.is_closed
+    assert await subscriber.get() == []
+    assert not broadcaster.subscribers
+
+
+async def test_catch_up_without_duplicates():
+    broadcaster = Broadcaster(history_size=10, subscriber_buffer_size=10)
+    broadcaster.publish(Event(channel='a', value=1))
+    subscriber = broadcaster.subscribe()
+    broadcaster.publish(Event(channel='b', value=2))  # published while the response is being prepared
+
+    sent = [*broadcaster.iter_recent(subscriber), *await subscriber.get()]
+    assert [id_ for id_, _ in sent] == [1, 2]
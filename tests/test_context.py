@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from asyncio import Event as Signal
+from asyncio import create_task, wait_for
+from types import ModuleType
+from typing import Any, List
+
+from pytest import MonkeyPatch
+from sqlitemap import Connection
+
+from my_iot import context as context_module
+from my_iot.context import Context
+from my_iot.routing import EventRouter, if_channel
+from my_iot.types_ import Event, Unit
+
+
+async def test_slow_handler_does_not_block_other_channels(db: Connection, monkeypatch: MonkeyPatch):
+    router = EventRouter()
+    monkeypatch.setattr(context_module, 'router', router)
+    release = Signal()
+    fast_values: List[Any] = []
+    done = Signal()
+
+    @router
+    @if_channel('slow')
+    async def on_slow(**_: Any):
+        await release.wait()
+
+    @router
+    @if_channel('fast')
+    async def on_fast(*, event: Event, **_: Any):
+        fast_values.append(event.value)
+        if len(fast_values) == 20:
+            done.set()
+
+    context = Context(automation=ModuleType('test_automation'), db=db, queue_workers=1)
+    worker = create_task(context.run_worker())
+    try:
+        await context.queue.put(Event(channel='slow', unit=Unit.CELSIUS, value=0.0), 'test')
+        for i in range(20):
+            await context.queue.put(Event(channel='fast', unit=Unit.CELSIUS, value=float(i)), 'test')
+        await wait_for(done.wait(), 1.0)
+        assert fast_values == [float(i) for i in range(20)]
+        assert len([task for task in context.routing_tasks if not task.done()]) == 1  # the slow handler is running
+    finally:
+        release.set()
+        worker.cancel()
+        await context.close()
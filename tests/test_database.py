@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from pytest import mark
+from sqlitemap import Connection
+
+from my_iot.compression import Compression, Compressor
+from my_iot.database import (
+    EVENT_INCLUDE,
+    get_downsampled_log,
+    get_log,
+    iter_log,
+    rebuild_rollups,
+    save_event,
+    save_events,
+    timestamp_key,
+)
+from my_iot.types_ import Event, Unit
+
+
+def test_chunked_log(db: Connection):
+    now = datetime.now(timezone.utc)
+    save_events(db, [
+        Event(channel='test', unit=Unit.CELSIUS, value=float(i), timestamp=(now - timedelta(minutes=(10 * i))))
+        for i in range(20)
+    ])
+    save_event(db, Event(channel='test', unit=Unit.CELSIUS, value=42.0, timestamp=now))  # replaces the reading
+    events = get_log(db, 'test', timedelta(minutes=25))
+    assert [event.value for event in events] == [2.0, 1.0, 42.0]
+
+
+def test_plain_log_is_still_read(db: Connection):
+    timestamp = datetime.now(timezone.utc) - timedelta(minutes=2)
+    db['log:test'][timestamp_key(timestamp)] = Event(value=1.0, timestamp=timestamp).dict(include=EVENT_INCLUDE)
+    save_event(db, Event(channel='test', unit=Unit.CELSIUS, value=2.0))
+    assert [event.value for event in get_log(db, 'test', timedelta(minutes=5))] == [1.0, 2.0]
+
+
+def test_downsampled_log_keeps_peaks(db: Connection):
+    now = datetime.now(timezone.utc)
+    save_events(db, [
+        Event(
+            channel='test',
+            unit=Unit.CELSIUS,
+            value=(100.0 if i == 500 else 0.0),
+            timestamp=(now - timedelta(seconds=i)),
+        )
+        for i in range(1, 1000)
+    ])
+    timestamps, values = get_downsampled_log(db, 'test', timedelta(seconds=1000), max_points=20)
+    assert len(timestamps) <= 20
+    assert timestamps == sorted(timestamps)
+    assert max(values) == 100.0
+
+    assert get_downsampled_log(db, 'test', timedelta(seconds=1000), max_points=1)[1] == [100.0]
+
+
+def test_rollups(db: Connection):
+    timestamp = datetime(2019, 1, 1, 12, 0, 30, tzinfo=timezone.utc)
+    save_events(db, [
+        Event(channel='test', unit=Unit.CELSIUS, value=value, timestamp=(timestamp + timedelta(seconds=i)))
+        for i, value in enumerate([1.0, 5.0, 3.0])
+    ])
+    save_event(db, Event(channel='test', unit=Unit.CELSIUS, value=3.0, timestamp=(timestamp + timedelta(seconds=2))))
+    expected = [timestamp.replace(second=0).timestamp(), 3, 1.0, 5.0, 9.0]
+    assert db['rollup:minute:test'].values() == [expected]
+    assert len(db['rollup:day:test']) == 1
+
+    del db['rollup:minute:test']
+    assert rebuild_rollups(db) == 1
+    assert db['rollup:minute:test'].values() == [expected]
+
+
+@mark.parametrize('swinging_door, expected', [
+    (True, [0.0, 0.0, 2.0, 2.0, 5.0]),
+    (False, [0.0, 0.0, 1.0, 2.0, 2.0, 5.0]),
+])
+def test_compression(db: Connection, swinging_door: bool, expected: list):
+    now = datetime.now(timezone.utc)
+    values = [0.0, 0.0, 0.0, 1.0, 2.0, 2.0, 2.0, 5.0]
+    compressor = Compressor([Compression(tolerance=0.1, swinging_door=swinging_door)])
+    for i, value in enumerate(values):
+        timestamp = now - timedelta(minutes=(len(values) - i))
+        save_events(db, [Event(channel='test', unit=Unit.CELSIUS, value=value, timestamp=timestamp)], compressor)
+    assert [event.value for event in get_log(db, 'test', timedelta(minutes=10))] == expected
+    assert next(iter(db['rollup:day:test'].values()))[1] == len(values)  # rollups count every reading
+
+
+def test_compressed_reading_rewrite(db: Connection):
+    timestamp = datetime(2020, 1, 1, 12, tzinfo=timezone.utc)
+    compressor = Compressor([Compression(tolerance=0.1)])
+
+    def save(second: int, value: float):
+        event = Event(channel='test', unit=Unit.CELSIUS, value=value, timestamp=(timestamp + timedelta(seconds=second)))
+        save_events(db, [event], compressor)
+
+    for second in range(3):
+        save(second, 0.0)  # the middle one is removed
+    save(1, 5.0)
+    assert db['rollup:minute:test'].values() == [[timestamp.timestamp(), 3, 0.0, 5.0, 5.0]]
+
+
+def test_chunk_segments(db: Connection):
+    start = datetime(2020, 1, 1, 12, tzinfo=timezone.utc)
+
+    def save(*seconds: int):
+        save_events(db, [
+            Event(channel='test', unit=Unit.CELSIUS, value=float(i), timestamp=(start + timedelta(seconds=i)))
+            for i in seconds
+        ])
+
+    def get_values() -> list:
+        return [reading.value for reading in iter_log(db, 'test', start)]
+
+    # New readings are appended to the segments rather than to the chunk itself.
+    for i in range(0, 250, 50):
+        save(*range(i, i + 50))
+    keys = list(db['chunks:test'].keys())
+    assert len(keys) == 3 and all(len(key) == 40 for key in keys)
+    assert get_values() == [float(i) for i in range(250)]
+
+    # An out-of-order reading seals the chunk.
+    save(100)
+    assert list(db['chunks:test'].keys()) == [timestamp_key(start)]
+    save(250)
+    assert len(db['chunks:test']) == 2
+    assert get_values() == [float(i) for i in range(251)]
+
+    # The next chunk seals the previous one.
+    save(3600)
+    assert list(db['chunks:test'].keys())[0] == timestamp_key(start)
+    assert len(db['chunks:test']) == 2
+    assert get_values() == [*(float(i) for i in range(251)), 3600.0]
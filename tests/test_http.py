@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import Callable
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from my_iot.http_ import HttpClients
+
+
+async def test_shared_connections(aiohttp_server: Callable[..., TestServer]):
+    async def get_port(request: web.Request) -> web.Response:
+        return web.Response(text=str(request.transport.get_extra_info('peername')[1]))
+
+    app = web.Application()
+    app.router.add_get('/', get_port)
+    server = await aiohttp_server(app)
+
+    http = HttpClients()
+    first, second = http.get_session('first'), http.get_session('second')
+    assert http.get_session('first') is first
+    assert first.connector is second.connector is http.connector
+
+    ports = []
+    for session in (first, second):
+        async with session.get(server.make_url('/')) as response:
+            ports.append(await response.text())
+    assert ports[0] == ports[1]  # the keep-alive connection is reused by the other session
+    assert http.stats[server.host].n_requests == 2
+    assert http.n_active == 0
+
+    connector = http.connector
+    await http.close()
+    assert first.closed and second.closed
+    assert connector.closed
+    assert not http.sessions
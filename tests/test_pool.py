@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pytest import fixture, raises
+
+from my_iot.database import get_downsampled_log, get_log, get_stats, open_database, save_events
+from my_iot.pool import ReaderPool
+from my_iot.types_ import Event, Unit
+
+
+@fixture
+def path(tmp_path: Path) -> str:
+    return str(tmp_path / 'db.sqlite3')
+
+
+async def test_read(path: str):
+    db = open_database(path)
+    now = datetime.now(timezone.utc)
+    save_events(db, [
+        Event(channel='test', unit=Unit.CELSIUS, value=float(i), timestamp=(now - timedelta(minutes=i)))
+        for i in range(3)
+    ])
+    readers = ReaderPool(path, 2)
+    try:
+        assert [reading.value for reading in await readers.read(get_log, 'test', timedelta(hours=1))] == [2.0, 1.0, 0.0]
+    finally:
+        readers.close()
+        db.close()
+
+
+async def test_missing_channel_while_writing(path: str):
+    """
+    Reading a channel without any collection neither creates one nor waits for the writer.
+    """
+    db = open_database(path)
+    readers = ReaderPool(path, 1)
+    try:
+        db.connection.execute('BEGIN IMMEDIATE')  # the writer holds the write lock
+        assert await readers.read(get_log, 'missing', timedelta(hours=1)) == []
+        assert await readers.read(get_downsampled_log, 'missing', timedelta(days=30)) == ([], [])
+        assert await readers.read(get_stats, 'missing', timedelta(days=30)) is None
+        db.connection.rollback()
+        assert not [name for name in db if 'missing' in name]
+    finally:
+        readers.close()
+        db.close()
+
+
+async def test_read_only(path: str):
+    db = open_database(path)
+    readers = ReaderPool(path, 1)
+    try:
+        with raises(sqlite3.OperationalError):
+            await readers.read(lambda reader: reader.connection.execute('CREATE TABLE test (id)'))
+    finally:
+        readers.close()
+        db.close()
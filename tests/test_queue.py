@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from asyncio import create_task, sleep
+
+from my_iot.queue_ import EventQueue, Overflow
+from my_iot.types_ import Event
+
+
+async def test_coalesce():
+    queue = EventQueue(2, Overflow.COALESCE)
+    assert await queue.put(Event(channel='a', value=1), 'test')
+    assert await queue.put(Event(channel='b', value=2), 'test')
+    assert await queue.put(Event(channel='a', value=3), 'test')
+    assert [(await queue.get()).value for _ in range(2)] == [3, 2]
+    assert queue.stats['test'].n_coalesced == 1
+
+
+async def test_coalesce_only_when_full():
+    queue = EventQueue(3, Overflow.COALESCE)
+    assert await queue.put(Event(channel='a', value=1), 'test')
+    assert await queue.put(Event(channel='a', value=2), 'test')
+    assert [(await queue.get()).value for _ in range(2)] == [1, 2]
+    assert queue.stats['test'].n_coalesced == 0
+
+
+async def test_drop():
+    queue = EventQueue(1, Overflow.DROP)
+    assert await queue.put(Event(channel='a', value=1), 'test')
+    assert not await queue.put(Event(channel='a', value=2), 'test')
+    assert queue.stats['test'].n_dropped == 1
+
+
+async def test_block():
+    queue = EventQueue(1, Overflow.BLOCK)
+    await queue.put(Event(channel='a', value=1), 'test')
+    task = create_task(queue.put(Event(channel='a', value=2), 'test'))
+    await sleep(0.01)
+    assert not task.done()
+    assert (await queue.get()).value == 1
+    assert await task
+    assert (await queue.get()).value == 2
+    assert queue.stats['test'].wait_time > 0.0
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pytest import mark
+from sqlitemap import Connection
+
+from my_iot.database import get_downsampled_log, get_log, save_events
+from my_iot.retention import Retention, compact
+from my_iot.rollups import choose_resolution
+from my_iot.types_ import Event, Unit
+from my_iot.writer import EventWriter
+
+# Same as in the recipe.
+RETENTION = Retention(unit=Unit.CELSIUS, raw=timedelta(days=7), rollups={'minute': timedelta(days=7)})
+
+
+@mark.parametrize('period, age, retention, expected', [
+    (timedelta(hours=1), None, None, None),
+    (timedelta(hours=1), None, RETENTION, None),
+    (timedelta(hours=1), timedelta(days=8), RETENTION, 'hour'),
+    (timedelta(days=2), None, RETENTION, 'minute'),
+    (timedelta(days=10), None, None, 'minute'),
+    (timedelta(days=10), None, RETENTION, 'hour'),
+    (timedelta(days=30), None, RETENTION, 'hour'),
+])
+def test_choose_resolution(period: timedelta, age: Optional[timedelta], retention: Optional[Retention], expected: str):
+    assert choose_resolution(period, 250, retention, age) == expected
+
+
+async def test_compact(db: Connection):
+    now = datetime.now(timezone.utc)
+    save_events(db, [
+        Event(channel='test', unit=Unit.CELSIUS, value=float(days), timestamp=(now - timedelta(days=days)))
+        for days in (10, 1)
+    ])
+    writer = EventWriter(db)
+    try:
+        n_deleted, _ = await compact(writer, [RETENTION], {'test': Event(channel='test', unit=Unit.CELSIUS, value=1.0)})
+    finally:
+        await writer.close()
+    assert n_deleted == 2  # the raw chunk and the minute rollup
+    assert [reading.value for reading in get_log(db, 'test', timedelta(days=30))] == [1.0]
+
+    # The chart still has the older reading from the hourly rollups.
+    _, values = get_downsampled_log(db, 'test', timedelta(days=30), retention=RETENTION)
+    assert 10.0 in values
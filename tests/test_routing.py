@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from asyncio import gather, sleep
+from datetime import timedelta
+from typing import Any, List
+
+from my_iot.routing import EventRouter, HandlerOverflow, if_, if_channel, if_channel_like, if_equals, with_limits
+from my_iot.types_ import Event
+
+
+async def test_on_event():
+    router = EventRouter()
+    calls: List[str] = []
+
+    @router
+    @if_channel_like(r'test:.*')
+    async def on_pattern(**_: Any):
+        calls.append('pattern')
+
+    @router
+    @if_equals(42)
+    @if_channel('test:exact')
+    async def on_exact(**_: Any):
+        calls.append('exact')
+
+    @router
+    @if_(lambda event, **_: event.value == 42)
+    async def on_generic(**_: Any):
+        calls.append('generic')
+
+    await router.on_event(event=Event(channel='test:exact', value=42))
+    assert calls == ['pattern', 'exact', 'generic']
+
+    calls.clear()
+    await router.on_event(event=Event(channel='other', value=42))
+    assert calls == ['generic']
+
+    assert router.get_candidates('other') == [on_generic]
+    assert router.get_candidates('test:exact') == [on_pattern, on_exact, on_generic]
+    assert router.get_candidates('test:other') == [on_pattern, on_generic]
+
+
+async def test_concurrent_with_limits():
+    router = EventRouter()
+    calls: List[Any] = []
+
+    @router
+    @if_channel('test')
+    @with_limits(max_running=1, overflow=HandlerOverflow.COALESCE)
+    async def on_slow(event: Event, **_: Any):
+        calls.append(event.value)
+        await sleep(0.01)
+
+    @router
+    @with_limits(timeout=timedelta(seconds=0.01))
+    async def on_stuck(**_: Any):
+        await sleep(1.0)
+
+    await gather(*[router.on_event(event=Event(channel='test', value=i)) for i in range(5)])
+    assert calls == [0, 4]
+    assert router.n_running == 0
+    assert not hasattr(on_slow, 'running')  # the limiter state isn't copied by `wraps`
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+from asyncio import gather, sleep, wait_for
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from time import monotonic
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import ujson
+from aiohttp_sse_client.client import MessageEvent
+from pytest import MonkeyPatch, mark
+
+from my_iot.database import open_database, save_events
+from my_iot.inotify import watcher
+from my_iot.services import nest
+from my_iot.services.base import Service
+from my_iot.services.buienradar import Buienradar, Feed, Snapshot, channels
+from my_iot.services.file_ import FloatValueFile
+from my_iot.services.replay import DatabaseReplay, JsonLinesReplay
+from my_iot.services.synthetic import RandomWalk
+from my_iot.types_ import Event, Unit
+
+
+async def take(service: Service, n_events: int) -> List[Event]:
+    events = []
+    async for event in service.events:
+        events.append(event)
+        if len(events) == n_events:
+            return events
+
+
+async def test_json_lines_replay(tmp_path: Path):
+    path = tmp_path / 'events.jsonl'
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    path.write_text(''.join(
+        Event(channel='test', unit=Unit.CELSIUS, value=float(i), timestamp=(start + timedelta(seconds=i))).json() + '\n'
+        for i in range(3)
+    ))
+
+    start_time = monotonic()
+    events = await take(JsonLinesReplay(path, speed=20.0), 3)
+    assert monotonic() - start_time >= 0.1  # the gaps are 50 ms long
+    assert [event.channel for event in events] == ['replay:test'] * 3
+    assert [event.value for event in events] == [0.0, 1.0, 2.0]
+    assert events[0].timestamp > start
+
+
+async def test_database_replay(tmp_path: Path):
+    path = tmp_path / 'db.sqlite3'
+    db = open_database(str(path))
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    save_events(db, [
+        Event(channel='float', unit=Unit.CELSIUS, value=1.0, timestamp=start, title='Float'),
+        Event(channel='text', unit=Unit.TEXT, value='a', timestamp=(start + timedelta(seconds=1))),
+        Event(channel='float', unit=Unit.CELSIUS, value=2.0, timestamp=(start + timedelta(seconds=2)), title='Float'),
+        Event(channel='ignored', unit=Unit.CELSIUS, value=0.0, timestamp=start),
+    ])
+    db.close()
+
+    start_time = monotonic()
+    events = await take(DatabaseReplay(path, ['float', 'text', 'missing'], since=start, speed=20.0), 3)
+    assert monotonic() - start_time >= 0.1  # the gaps are 50 ms long
+    assert [(event.channel, event.value) for event in events] == [
+        ('replay:float', 1.0),
+        ('replay:text', 'a'),
+        ('replay:float', 2.0),
+    ]
+    assert events[0].unit == Unit.CELSIUS and events[0].title == 'Float'
+    assert events[1].unit == Unit.TEXT
+    assert events[0].timestamp > start
+
+
+async def test_random_walk():
+    events = await take(RandomWalk('test', n_channels=2, rate=1000.0, seed=42), 4)
+    assert [event.channel for event in events] == ['random:test:0', 'random:test:1'] * 2
+
+
+async def test_buienradar_shared_feed(monkeypatch: MonkeyPatch):
+    feed = {
+        'actual': {
+            'sunrise': '2020-01-01T08:48:00',
+            'sunset': '2020-01-01T16:37:00',
+            'stationmeasurements': [
+                {
+                    'stationid': station_id,
+                    'stationname': f'Station {station_id}',
+                    'timestamp': '2020-01-01T12:00:00',
+                    **{key: 1.0 for key, *_ in channels},
+                }
+                for station_id in (1, 2)
+            ],
+        },
+    }
+    n_fetches = 0
+
+    async def fetch(_session: Any, _snapshot: Optional[Snapshot]) -> Snapshot:
+        nonlocal n_fetches
+        n_fetches += 1
+        await sleep(0.01)
+        return Snapshot(feed, None, None)
+
+    monkeypatch.setattr(Feed, 'fetch', staticmethod(fetch))
+    shared_feed = Feed()
+    snapshots = await gather(*[shared_feed.get(None, 300.0) for _ in range(3)])
+    assert n_fetches == 1
+    assert snapshots[0] is snapshots[1] is snapshots[2]
+
+    # The stations pick their own measurements from the same snapshot.
+    events = list(Buienradar(2).yield_events(snapshots[0]))
+    assert events[-1].channel == 'buienradar:2:weather_description'
+    assert events[-1].title == 'Station 2 Description'
+
+    await shared_feed.get(None, 0.0)  # expired
+    assert n_fetches == 2
+
+
+async def test_nest_changed_fields(monkeypatch: MonkeyPatch):
+    def make_put(temperature: float) -> MessageEvent:
+        thermostat = {
+            'name': 'Hallway',
+            'ambient_temperature_c': temperature,
+            'humidity': 50,
+            'is_online': True,
+            'hvac_state': 'off',
+            'target_temperature_c': 20.0,
+        }
+        data = {
+            'structures': {},
+            'devices': {'cameras': {}, 'thermostats': {'t': thermostat}, 'smoke_co_alarms': {}},
+        }
+        return MessageEvent('put', None, ujson.dumps({'data': data}), None, None)
+
+    class EventSource:
+        def __init__(self, *_args: Any, **_kwargs: Any):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *_args: Any):
+            pass
+
+        async def __aiter__(self):
+            for temperature in (21.0, 21.0, 21.5):
+                yield make_put(temperature)
+
+    monkeypatch.setattr(nest, 'EventSource', EventSource)
+    service = nest.Nest('token')
+    service.http = SimpleNamespace(get_session=(lambda: None))
+    events = await take(service, 6)
+    assert [event.channel for event in events[:5]] == [
+        'nest:thermostat:t:ambient_temperature_c',
+        'nest:thermostat:t:humidity',
+        'nest:thermostat:t:is_online',
+        'nest:thermostat:t:hvac_state',
+        'nest:thermostat:t:target_temperature_c',
+    ]
+    # The second snapshot is the same, and the third one changes only the temperature.
+    assert (events[5].channel, events[5].value) == ('nest:thermostat:t:ambient_temperature_c', 21.5)
+
+
+@mark.skipif(watcher.libc is None, reason='inotify is not available')
+async def test_file_rewrite(tmp_path: Path):
+    path = tmp_path / 'value'
+    path.write_text('1')
+    events = FloatValueFile(path, 'test', timedelta(minutes=1), Unit.CELSIUS).events
+    try:
+        assert (await events.__anext__()).value == 1.0
+
+        # Both the in-place write and the replacement are picked up long before the interval.
+        path.write_text('2')
+        assert (await wait_for(events.__anext__(), 5.0)).value == 2.0
+        (tmp_path / 'value.new').write_text('3')
+        (tmp_path / 'value.new').rename(path)
+        assert (await wait_for(events.__anext__(), 5.0)).value == 3.0
+    finally:
+        await events.aclose()
+    assert watcher.fd is None
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from asyncio import gather
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from pytest import MonkeyPatch, raises
+
+from my_iot.actions import telegram
+from my_iot.actions.telegram import Outbox
+
+
+class Response:
+    def __init__(self, status: int = 200, body: Optional[Any] = None):
+        self.status = status
+        self.body = body
+
+    async def json(self, **_: Any) -> Any:
+        if not isinstance(self.body, dict):
+            raise ValueError('not JSON')
+        return self.body
+
+
+class Telegram:
+    """
+    Pretends to be the API. Returns the prepared responses, or raises the prepared errors, in order.
+    """
+
+    def __init__(self, *responses: Any):
+        self.responses = list(responses)
+        self.calls: List[Dict[str, Any]] = []
+        self.call_times: List[float] = []
+
+    async def post(self, _: Any, __: str, method: str, data: Dict[str, Any]) -> Response:
+        self.calls.append({'method': method, **data})
+        self.call_times.append(monotonic())
+        response = self.responses.pop(0) if self.responses else Response()
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+async def test_rate_limit(monkeypatch: MonkeyPatch):
+    api = Telegram()
+    monkeypatch.setattr(telegram, 'post', api.post)
+    outbox = Outbox('token', chat_rate=20.0)
+    await gather(*[outbox.send_animation(None, '42', f'animation-{i}') for i in range(3)])
+    assert [call['animation'] for call in api.calls] == ['animation-0', 'animation-1', 'animation-2']
+    assert api.call_times[2] - api.call_times[0] >= 0.09  # about 50 ms in between
+    assert not outbox.queues
+
+
+async def test_merge(monkeypatch: MonkeyPatch):
+    api = Telegram()
+    monkeypatch.setattr(telegram, 'post', api.post)
+    outbox = Outbox('token', chat_rate=1000.0)
+    await gather(*[outbox.send_message(None, '42', text) for text in ('a', 'b', 'c')])
+    await gather(outbox.send_message(None, '42', 'd'), outbox.send_message(None, '42', 'e', disable_notification=True))
+    assert [call['text'] for call in api.calls] == ['a\n\nb\n\nc', 'd', 'e']
+
+
+async def test_retry_after(monkeypatch: MonkeyPatch):
+    api = Telegram(Response(429, {'parameters': {'retry_after': 0.1}}), Response(429, 'Too Many Requests'))
+    monkeypatch.setattr(telegram, 'post', api.post)
+    monkeypatch.setattr(telegram, 'DEFAULT_RETRY_AFTER', 0.1)
+    outbox = Outbox('token', chat_rate=1000.0)
+    response = await outbox.send_message(None, '42', 'text')
+    assert response.status == 200
+    assert len(api.calls) == 3
+    assert api.call_times[1] - api.call_times[0] >= 0.09
+    assert api.call_times[2] - api.call_times[1] >= 0.09
+
+
+async def test_error(monkeypatch: MonkeyPatch):
+    api = Telegram(RuntimeError('unexpected'))
+    monkeypatch.setattr(telegram, 'post', api.post)
+    outbox = Outbox('token', chat_rate=1000.0)
+    failed = outbox.send_animation(None, '42', 'animation-0')
+    sent = outbox.send_animation(None, '42', 'animation-1')
+    with raises(RuntimeError):
+        await failed
+    assert (await sent).status == 200
+    assert not outbox.queues
+
+
+async def test_attempts(monkeypatch: MonkeyPatch):
+    api = Telegram(*[telegram.ClientError('network')] * telegram.MAX_ATTEMPTS)
+    monkeypatch.setattr(telegram, 'post', api.post)
+    monkeypatch.setattr(telegram, 'MAX_ATTEMPTS', 1)  # so that there's no back-off
+    outbox = Outbox('token')
+    assert await outbox.send_message(None, '42', 'text') is None
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import aiohttp_jinja2
+from aiohttp.web import Application
+
+from my_iot import templates
+from my_iot.types_ import Event, Unit
+
+
+def test_tile_cache():
+    app = Application()
+    templates.setup(app)
+    render_tile = aiohttp_jinja2.get_env(app).globals['render_tile']
+    timestamp = datetime.now(timezone.utc)
+
+    tile = render_tile(Event(channel='test', unit=Unit.CELSIUS, value=21.0, timestamp=timestamp))
+    assert 'title="21.0"' in tile
+
+    # The same event isn't rendered again.
+    assert render_tile(Event(channel='test', unit=Unit.CELSIUS, value=21.0, timestamp=timestamp)) is tile
+
+    # An updated event replaces the tile, even if it has the same timestamp.
+    tile = render_tile(Event(channel='test', unit=Unit.CELSIUS, value=22.0, timestamp=timestamp))
+    assert 'title="22.0"' in tile
+    tile = render_tile(Event(channel='test', unit=Unit.CELSIUS, value=22.0, timestamp=timestamp, title='Updated'))
+    assert 'Updated' in tile
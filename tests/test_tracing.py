@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from pathlib import Path
+
+import ujson
+
+from my_iot.tracing import Tracer
+from my_iot.types_ import Event
+
+
+def test_slow_trace(tmp_path: Path):
+    path = tmp_path / 'traces' / 'slow.jsonl'
+    tracer = Tracer(sample_rate=1.0, threshold=timedelta(), path=str(path))
+    trace = tracer.start(Event(channel='test', value=1))
+    trace.mark('saved')
+    tracer.finish(trace)
+    tracer.close()
+
+    assert tracer.get_slowest() == [trace]
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    assert [name for name, _ in ujson.loads(lines[0])['spans']] == ['saved', 'finished']
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
 from aiohttp import test_utils
-from pytest import mark
+from pytest import MonkeyPatch, mark
+
+from my_iot import writer
+from my_iot.context import Context
+from my_iot.types_ import Event, Unit
 
 
 @mark.parametrize('url', [
@@ -9,6 +16,8 @@ from pytest import mark
     '/favicon.ico',
     '/services',
     '/events',
+    '/metrics',
+    '/debug/slow',
 ])
 async def test_url_200(client: test_utils.TestClient, url: str):
     response = await client.get(url)
@@ -17,7 +26,96 @@ async def test_url_200(client: test_utils.TestClient, url: str):
 
 @mark.parametrize('url', [
     '/__init__.py',
+    '/channel/missing',
 ])
 async def test_not_found(client: test_utils.TestClient, url: str):
     response = await client.get(url)
     assert response.status == 404
+
+
+async def test_index_shows_saved_values(client: test_utils.TestClient, monkeypatch: MonkeyPatch):
+    context: Context = client.server.app['context']
+    await context.on_event(Event(channel='test', unit=Unit.CELSIUS, value=21.0))
+
+    def save_events(*_: Any):
+        raise OSError('disk I/O error')
+
+    async def read(*_: Any):
+        raise AssertionError('the index page must not read the database')
+
+    monkeypatch.setattr(writer, 'save_events', save_events)
+    monkeypatch.setattr(context, 'read', read)
+    await context.on_event(Event(channel='test', unit=Unit.CELSIUS, value=22.0))
+
+    response = await client.get('/')
+    assert response.status == 200
+    text = await response.text()
+    assert 'title="21.0"' in text
+    assert 'title="22.0"' not in text
+
+
+async def test_channel_log(client: test_utils.TestClient):
+    context: Context = client.server.app['context']
+    now = datetime.now(timezone.utc)
+    for i in range(3):
+        await context.on_event(Event(channel='test', unit=Unit.CELSIUS, value=float(i), timestamp=(now - timedelta(i))))
+
+    params = {'from': str((now - timedelta(days=1.5)).timestamp()), 'to': str(now.timestamp() + 1.0)}
+    response = await client.get('/api/channel/test/log', params=params)
+    assert response.status == 200
+    assert [value for _, value in await response.json()] == [1.0, 0.0]
+    etag = response.headers['ETag']
+
+    response = await client.get('/api/channel/test/log', params=params, headers={'If-None-Match': etag})
+    assert response.status == 304
+
+    response = await client.get('/api/channel/test/log', params=params, headers={
+        'If-None-Match': f'"other", {etag[2:]}',
+    })
+    assert response.status == 304
+
+    # Another window is another resource.
+    response = await client.get('/api/channel/test/log', params={**params, 'max_points': '1'}, headers={
+        'If-None-Match': etag,
+    })
+    assert response.status == 200
+    response = await client.get('/api/channel/test/log', params=params, headers={'If-None-Match': f'{etag}x'})
+    assert response.status == 200
+
+    # The sliding window is cached until the channel gets a new reading.
+    response = await client.get('/api/channel/test/log')
+    sliding_etag = response.headers['ETag']
+    response = await client.get('/api/channel/test/log', headers={'If-None-Match': sliding_etag})
+    assert response.status == 304
+    await context.on_event(Event(channel='test', unit=Unit.CELSIUS, value=3.0))
+    response = await client.get('/api/channel/test/log', headers={'If-None-Match': sliding_etag})
+    assert response.status == 200
+    assert [value for _, value in await response.json()] == [0.0, 3.0]
+
+    # Parameters are validated before the cache.
+    response = await client.get('/api/channel/test/log', params={**params, 'max_points': '0'}, headers={
+        'If-None-Match': etag,
+    })
+    assert response.status == 400
+
+
+async def test_static(client: test_utils.TestClient):
+    response = await client.get('/site.webmanifest', headers={'Accept-Encoding': 'gzip'})
+    assert response.status == 200
+    assert response.headers['Content-Type'] == 'application/manifest+json'
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+    response = await client.get('/site.webmanifest', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status == 304
+
+
+async def test_metrics(client: test_utils.TestClient):
+    context: Context = client.server.app['context']
+    await context.on_event(Event(channel='test', unit=Unit.CELSIUS, value=1.0))
+    await client.get('/')
+
+    response = await client.get('/metrics')
+    assert response.status == 200
+    text = await response.text()
+    assert 'my_iot_write_seconds_count ' in text  # the registry is global, so other tests add up
+    assert 'my_iot_http_request_seconds_bucket{route="/",le="+Inf"}' in text
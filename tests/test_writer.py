@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from asyncio import sleep
+from datetime import timedelta
+from typing import Any
+
+from pytest import MonkeyPatch, raises
+from sqlitemap import Connection
+
+from my_iot import writer as writer_module
+from my_iot.compression import Compression, Compressor
+from my_iot.database import get_log, save_events
+from my_iot.types_ import Event, Unit
+from my_iot.writer import EventWriter
+
+
+def make_event(value: float) -> Event:
+    return Event(channel='test', unit=Unit.CELSIUS, value=value)
+
+
+async def test_batch_size(db: Connection):
+    writer = EventWriter(db, max_size=2, max_delay=timedelta(hours=1))
+    first = writer.put(make_event(1.0))
+    await sleep(0.01)
+    assert not first.done()
+    second = writer.put(make_event(2.0))
+    await second
+    assert first.done()
+    assert len(get_log(db, 'test', timedelta(minutes=1))) == 2
+    await writer.close()
+
+
+async def test_batch_delay(db: Connection):
+    writer = EventWriter(db, max_size=100, max_delay=timedelta(milliseconds=50))
+    future = writer.put(make_event(1.0))
+    await sleep(0.01)
+    assert not future.done()
+    await future
+    assert writer.depth == 0
+    await writer.close()
+
+
+async def test_close(db: Connection):
+    writer = EventWriter(db, max_size=100, max_delay=timedelta(hours=1))
+    future = writer.put(make_event(1.0))
+    await writer.close()
+    assert future.done()
+    assert len(get_log(db, 'test', timedelta(minutes=1))) == 1
+
+
+async def test_cancelled_waiter(db: Connection):
+    writer = EventWriter(db, max_size=100, max_delay=timedelta(hours=1))
+    cancelled = writer.put(make_event(1.0))
+    other = writer.put(make_event(2.0))
+    cancelled.cancel()
+    await writer.close()
+    assert other.done() and other.exception() is None
+    with raises(RuntimeError):
+        await writer.execute(len, [])  # the writer thread has been stopped
+    assert len(get_log(db, 'test', timedelta(minutes=1))) == 2
+
+
+async def test_compressor_is_kept_on_failure(db: Connection, monkeypatch: MonkeyPatch):
+    compressor = Compressor([Compression(tolerance=0.1)])
+    writer = EventWriter(db, compressor=compressor)
+    await writer.put(make_event(1.0))
+    door = compressor.doors['test']
+
+    def fail(*args: Any):
+        save_events(*args)  # changes the fork
+        raise OSError('disk I/O error')
+
+    monkeypatch.setattr(writer_module, 'save_events', fail)
+    with raises(OSError):
+        await writer.put(make_event(2.0))
+    assert compressor.doors['test'] is door
+    assert door.archived[1] == 1.0
+    await writer.close()